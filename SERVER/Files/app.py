@@ -1,34 +1,37 @@
-from flask import Flask, request, jsonify # type: ignore
+from flask import Flask, Blueprint, Response, request, jsonify # type: ignore
 from flask_cors import cross_origin,CORS # type: ignore
 
 
-from contollers.auth.Authentication import addUser,loginUser,verifyUser,parseUserData,addHomeBranch,getBanks,globalWallet,homeDelivery,getWallet,returnMoney,doKYC,transactionHistory
+from contollers.auth.Session import current_session
+from contollers.utils.Metrics import registry
+from contollers.utils.RequestMetrics import instrument_app
+from contollers.utils.JsonProvider import BsonJSONProvider
+from contollers.auth.Authentication import addUser,loginUser,verifyUser,parseUserData,verificationStatus,addHomeBranch,getBanks,globalWallet,globalBalance,homeDelivery,homeDeliveryBatch,getWallet,returnMoney,doKYC,transactionHistory,streamTransactionHistory,exchangeRateStats,upstreamStats,indexReport,cacheStats,uploadStats,kycCodeStats,conversionSummary,prepare_process,readiness
 
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint so create_app() can build the app without any I/O;
+# Mongo, storage and the job workers are set up on the first real request
+api = Blueprint('api', __name__)
 
-@app.route('/',methods=['GET'])
+# Probes must answer without triggering per-process setup
+PROBE_ENDPOINTS = ('api.healthz', 'api.readyz')
+
+@api.route('/',methods=['GET'])
 def home():
     return "<H1>PayTrue Server API - Homepage</H1>"
 '''
     USER AUTHENTICATION & VERIFICATION
 '''
-@app.route('/api/register', methods=['POST'])
+@api.route('/api/register', methods=['POST'])
 def add_user_route():
     try:
         response, status_code = addUser(request)
-        if "uid" in response:
-            response["uid"] = str(response["uid"])
-        if "data" in response and "_id" in response["data"]:
-            response["data"]["_id"] = str(response["data"]["_id"])
-    
     except Exception as e:
         response = {"error": str(e)}
         status_code = 500
     
     return jsonify(response), status_code
 
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login_route():
     user_data = request.json
     try:
@@ -38,17 +41,17 @@ def login_route():
         response = {"message": str(e),"success":False}
         return jsonify(response), 400
         
-@app.route('/api/verify', methods=['GET'])
+@api.route('/api/verify', methods=['GET'])
 def verify_route():
     id = request.args.get('uid')
     try:
-        response, status_code = verifyUser(id)
+        response, status_code = verifyUser(id, current_session(request))
     except Exception as e:
         response = {"error": str(e)}
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/parseaddress', methods=['GET'])
+@api.route('/api/parseaddress', methods=['GET'])
 def parse_address():
     id = request.args.get('uid')
     try:
@@ -58,7 +61,17 @@ def parse_address():
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/addhomebranch', methods=['POST'])
+@api.route('/api/parseaddress/status', methods=['GET'])
+def parse_address_status():
+    job_id = request.args.get('jobId')
+    try:
+        response, status_code = verificationStatus(job_id)
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/addhomebranch', methods=['POST'])
 def add_home_branch():
     try:
         response, status_code = addHomeBranch(request)
@@ -67,7 +80,7 @@ def add_home_branch():
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/getbanks', methods=['GET'])
+@api.route('/api/getbanks', methods=['GET'])
 def get_banks():
     uid = request.args.get('uid')
     try:
@@ -78,7 +91,7 @@ def get_banks():
     return jsonify(response), status_code
 
 
-@app.route('/api/globalwallet', methods=['GET'])
+@api.route('/api/globalwallet', methods=['GET'])
 def global_wallet():
     try:
         response, status_code = globalWallet()
@@ -87,7 +100,16 @@ def global_wallet():
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/getwallet', methods=['GET'])
+@api.route('/api/globalbalance', methods=['GET'])
+def global_balance():
+    try:
+        response, status_code = globalBalance()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/getwallet', methods=['GET'])
 def get_wallet():
     uid = request.args.get('uid')
     try:
@@ -98,7 +120,7 @@ def get_wallet():
     return jsonify(response), status_code
 
 
-@app.route('/api/homedelivery', methods=['POST'])
+@api.route('/api/homedelivery', methods=['POST'])
 def home_delivery():
     try:
         response, status_code = homeDelivery(request)
@@ -107,7 +129,16 @@ def home_delivery():
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/returnmoney', methods=['POST'])
+@api.route('/api/homedelivery/batch', methods=['POST'])
+def home_delivery_batch():
+    try:
+        response, status_code = homeDeliveryBatch(request)
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/returnmoney', methods=['POST'])
 def return_money():
     try:
         response, status_code = returnMoney(request)
@@ -117,7 +148,7 @@ def return_money():
     return jsonify(response), status_code
 
 
-@app.route('/api/getkyccode', methods=['GET'])
+@api.route('/api/getkyccode', methods=['GET'])
 def kyc():
     try:
         response, status_code = doKYC(request)
@@ -126,17 +157,123 @@ def kyc():
         status_code = 500
     return jsonify(response), status_code
 
-@app.route('/api/transactionhistory', methods=['GET'])
+@api.route('/api/transactionhistory', methods=['GET'])
 def transaction_history():
     uid = request.args.get('uid')
     try:
-        response, status_code = transactionHistory(uid)
+        # format=ndjson streams every transaction, one JSON document per line
+        if request.args.get('format') == 'ndjson':
+            return Response(streamTransactionHistory(uid, request.args.get('fields')), mimetype='application/x-ndjson')
+        response, status_code = transactionHistory(uid, request.args.get('limit'), request.args.get('cursor'), request.args.get('fields'))
+    except ValueError as e:
+        response = {"message": str(e)}
+        status_code = 400
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/conversionsummary', methods=['GET'])
+def conversion_summary():
+    uid = request.args.get('uid')
+    try:
+        response, status_code = conversionSummary(uid, request.args.get('months'))
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/exchangeratestats', methods=['GET'])
+def exchange_rate_stats():
+    try:
+        response, status_code = exchangeRateStats()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/upstreamstats', methods=['GET'])
+def upstream_stats():
+    try:
+        response, status_code = upstreamStats()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/indexreport', methods=['GET'])
+def index_report_route():
+    try:
+        response, status_code = indexReport()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/cachestats', methods=['GET'])
+def cache_stats():
+    try:
+        response, status_code = cacheStats()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/uploadstats', methods=['GET'])
+def upload_stats():
+    try:
+        response, status_code = uploadStats()
+    except Exception as e:
+        response = {"error": str(e)}
+        status_code = 500
+    return jsonify(response), status_code
+
+@api.route('/api/kyccodestats', methods=['GET'])
+def kyc_code_stats():
+    try:
+        response, status_code = kycCodeStats()
     except Exception as e:
         response = {"error": str(e)}
         status_code = 500
     return jsonify(response), status_code
 
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition format
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving
+    return jsonify({"status": "ok"}), 200
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    try:
+        response, status_code = readiness()
+    except Exception as e:
+        response = {"ready": False, "error": str(e)}
+        status_code = 503
+    return jsonify(response), status_code
+
+
+def prepare_request():
+    if request.endpoint not in PROBE_ENDPOINTS:
+        prepare_process()
+
+def create_app():
+    app = Flask(__name__)
+    # Serializes ObjectId, datetime and Decimal128 directly, so routes return documents as-is
+    app.json = BsonJSONProvider(app)
+    CORS(app)
+    instrument_app(app)
+    app.before_request(prepare_request)
+    app.register_blueprint(api)
+    return app
 
+app = create_app()
 
 if __name__ == '__main__':
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py`
     app.run(debug=True,host='0.0.0.0',port=8080)
\ No newline at end of file
@@ -0,0 +1,48 @@
+'''
+    Measures worker cold start: the time for a fresh interpreter to import app.py
+    and build the Flask app, which is what every new worker process pays.
+
+        python benchmarks/coldStart.py --runs 10
+
+    MONGO_URI points at an unroutable address by default, so any import-time
+    connection attempt shows up as a long or failed start instead of being
+    hidden by a fast local server. Compare against an older commit with
+    `git stash` / `git checkout <rev>`.
+'''
+import argparse, os, statistics, subprocess, sys, tempfile, time #type: ignore
+
+FILES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_APP = "import sys; sys.path.insert(0, sys.argv[1]); import app"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--mongo-uri", default="mongodb://10.255.255.1:27017/?serverSelectionTimeoutMS=2000")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URI=args.mongo_uri, MONGO_DB="paytrue_coldstart",
+               MONGO_COLLECTION_USERS="users", MONGO_COLLECTION_WALLETS="wallets",
+               MONGO_COLLECTION_GLOBALWALLETS="globalwallets",
+               MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS="moneywithdrawltransactions")
+
+    timings = []
+    for _ in range(args.runs):
+        # A scratch cwd so no upload folders or job database are left behind
+        workdir = tempfile.mkdtemp(prefix="paytrue-coldstart-")
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", IMPORT_APP, FILES_DIR], cwd=workdir, env=env, capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+        if result.returncode != 0:
+            print(result.stderr)
+            sys.exit(f"import app failed after {elapsed:.2f}s")
+        timings.append(elapsed)
+        created = sorted(os.listdir(workdir))
+        print(f"  {elapsed * 1000:8.1f}ms  files created at import: {created or 'none'}")
+
+    print(f"\nruns {len(timings)}  median {statistics.median(timings) * 1000:.1f}ms  min {min(timings) * 1000:.1f}ms  max {max(timings) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+    Compare two loadtest.py result files and flag regressions.
+
+        python benchmarks/compare.py baseline.json candidate.json --threshold 0.10
+
+    Exits with status 1 when any endpoint's p95 latency grows, or its throughput
+    drops, by more than the threshold at a concurrency level present in both runs.
+'''
+import argparse, json, sys #type: ignore
+
+
+def compare(baseline, candidate, threshold):
+    regressions = []
+    rows = []
+    for level, endpoints in candidate["levels"].items():
+        base_endpoints = baseline["levels"].get(level, {})
+        for endpoint, stats in endpoints.items():
+            base = base_endpoints.get(endpoint)
+            if not base:
+                continue
+            p95_change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+            rps_change = (stats["rps"] - base["rps"]) / base["rps"] if base["rps"] else 0.0
+            flagged = p95_change > threshold or rps_change < -threshold
+            rows.append((level, endpoint, base["p95_ms"], stats["p95_ms"], p95_change, base["rps"], stats["rps"], rps_change, flagged))
+            if flagged:
+                regressions.append((level, endpoint))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative change, e.g. 0.10 for 10%%")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"baseline {baseline.get('revision')}  candidate {candidate.get('revision')}")
+    for level, endpoint, base_p95, p95, p95_change, base_rps, rps, rps_change, flagged in rows:
+        marker = "REGRESSION" if flagged else ""
+        print(f"  c={level:>4} {endpoint:22} p95 {base_p95:>8.1f} -> {p95:>8.1f}ms ({p95_change:+.0%})  rps {base_rps:>8.1f} -> {rps:>8.1f} ({rps_change:+.0%})  {marker}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
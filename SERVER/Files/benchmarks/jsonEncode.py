@@ -0,0 +1,84 @@
+'''
+    Encode time for transaction-history payloads, before and after the JSON
+    provider change:
+
+      prewalk+stdlib  str() every _id, then json.dumps(sort_keys=True) with a
+                      default for datetime (the old jsonify path)
+      stdlib          one pass through json.dumps with bson_default (provider
+                      without orjson)
+      orjson          one pass through orjson with bson_default (provider with
+                      orjson installed)
+
+        python benchmarks/jsonEncode.py --documents 500 5000 --repeat 20
+'''
+import argparse, datetime, json, os, random, statistics, sys, time #type: ignore
+from bson import ObjectId #type: ignore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contollers.utils.Json import orjson,bson_default,dumps_bytes #type: ignore
+
+
+def transactions(count):
+    now = datetime.datetime.utcnow()
+    uid = str(ObjectId())
+    return [{
+        "_id": ObjectId(),
+        "uid": uid,
+        "fromCurrency": "USD",
+        "toCurrency": random.choice(["EUR", "INR", "GBP"]),
+        "fromAmount": round(random.uniform(1, 500), 2),
+        "toAmount": round(random.uniform(1, 500), 2),
+        "exchangeRate": random.uniform(0.5, 90),
+        "delivery": None,
+        "toDigital": True,
+        "message": "Money transferred to wallet",
+        "status": "completed",
+        "createdat": now - datetime.timedelta(minutes=i),
+    } for i in range(count)]
+
+
+def prewalk_stdlib(payload):
+    # The old path: copy each document and stringify _id, then Flask's encoder
+    documents = [dict(doc) for doc in payload["data"]]
+    for doc in documents:
+        doc["_id"] = str(doc["_id"])
+    return json.dumps(dict(payload, data=documents), sort_keys=True, default=lambda v: v.isoformat()).encode()
+
+def stdlib(payload):
+    return json.dumps(payload, default=bson_default, separators=(",", ":")).encode()
+
+
+def timed(encode, payload, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encode(payload)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    encoders = [("prewalk+stdlib", prewalk_stdlib), ("stdlib", stdlib)]
+    if orjson is not None:
+        encoders.append(("orjson", dumps_bytes))
+    else:
+        print("orjson is not installed; only the stdlib paths are measured")
+
+    for count in args.documents:
+        payload = {"data": transactions(count), "nextCursor": None, "success": True}
+        baseline = None
+        print(f"\n{count} documents")
+        for name, encode in encoders:
+            seconds = timed(encode, payload, args.repeat)
+            baseline = baseline or seconds
+            print(f"  {name:16} {seconds * 1000:9.3f}ms  {baseline / seconds:5.1f}x  {len(encode(payload))} bytes")
+
+
+if __name__ == '__main__':
+    main()
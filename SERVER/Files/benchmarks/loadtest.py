@@ -0,0 +1,218 @@
+'''
+    Offline load test for the PayTrue API.
+
+    Starts stub upstreams (benchmarks/stubs.py) and app.py (benchmarks/server.py)
+    in a scratch directory, registers a pool of users, then drives a weighted mix
+    of login, getwallet, homedelivery quote/confirm and transactionhistory calls
+    at each concurrency level. Per-endpoint p50/p95/p99 latency and requests per
+    second are written as JSON so runs can be compared across commits with
+    benchmarks/compare.py.
+
+        python benchmarks/loadtest.py --mongomock --concurrency 1 8 32 --duration 20 \
+            --upstream-latency 0.05 --output bench_results.json
+'''
+import argparse, json, os, random, subprocess, sys, tempfile, threading, time #type: ignore
+import requests #type: ignore
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from stubs import start_stub #type: ignore
+
+DEFAULT_MIX = "login=1,getwallet=4,quote=3,confirm=2,transactionhistory=2"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def start_server(args, stub_url, workdir):
+    env = dict(os.environ, EXCHANGE_RATE_API_BASE=stub_url, JASWANTH_BACKEND=stub_url)
+    command = [sys.executable, os.path.join(BENCH_DIR, "server.py"), "--port", str(args.port)]
+    if args.mongomock:
+        command.append("--mongomock")
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL if not args.verbose else None, stderr=subprocess.STDOUT)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup; rerun with --verbose")
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 60s")
+
+
+def register_users(base_url, count):
+    session = requests.Session()
+    session.get(base_url + "/api/globalwallet")
+    users = []
+    run_id = int(time.time())
+    for i in range(count):
+        email = f"bench-{run_id}-{i}@paytrue.local"
+        form = {
+            "name": f"Bench User {i}", "email": email, "phone": "0000000000", "gender": "other",
+            "dateOfBirth": "1990-01-01", "occupation": "tester", "country": "IN",
+            "idProofType": "passport", "addressProofType": "utility", "password": "bench-password",
+        }
+        files = {
+            "photograph": (f"photo-{i}.jpg", os.urandom(2048), "image/jpeg"),
+            "idProof": (f"id-{i}.jpg", os.urandom(2048), "image/jpeg"),
+            "addressProof": (f"address-{i}.jpg", os.urandom(2048), "image/jpeg"),
+        }
+        response = session.post(base_url + "/api/register", data=form, files=files)
+        if response.status_code != 201:
+            raise RuntimeError(f"Registration failed: {response.status_code} {response.text}")
+        login = session.post(base_url + "/api/login", json={"email": email, "password": "bench-password"}).json()
+        users.append({"email": email, "uid": login["uid"], "token": login.get("token")})
+    return users
+
+
+class Recorder:
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, wall_seconds):
+        result = {}
+        for endpoint, values in sorted(self.samples.items()):
+            values.sort()
+            result[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(values) / wall_seconds, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3),
+            }
+        return result
+
+
+def run_level(base_url, users, concurrency, duration, mix):
+    recorder = Recorder()
+    operations, weights = zip(*mix.items())
+    stop = time.time() + duration
+
+    def timed(session, endpoint, method, path, expected=(), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, timeout=30, **kwargs)
+            ok = response.status_code < 400 or response.status_code in expected
+        except requests.RequestException:
+            response, ok = None, False
+        recorder.record(endpoint, time.perf_counter() - started, ok)
+        return response
+
+    def worker():
+        session = requests.Session()
+        while time.time() < stop:
+            user = random.choice(users)
+            headers = {"Authorization": f"Bearer {user['token']}"} if user.get("token") else {}
+            operation = random.choices(operations, weights)[0]
+            if operation == "login":
+                timed(session, "login", "POST", "/api/login", json={"email": user["email"], "password": "bench-password"})
+            elif operation == "getwallet":
+                timed(session, "getwallet", "GET", "/api/getwallet", params={"uid": user["uid"]}, headers=headers)
+            elif operation == "transactionhistory":
+                # Users without conversions yet get 404 "No transactions found", a normal answer
+                timed(session, "transactionhistory", "GET", "/api/transactionhistory", expected=(404,), params={"uid": user["uid"]}, headers=headers)
+            else:
+                # Small amounts in both directions keep balances roughly stable
+                from_currency, to_currency = random.choice([("USD", "EUR"), ("EUR", "USD"), ("USD", "INR"), ("INR", "USD")])
+                amount = 0.01 if from_currency != "INR" else 1
+                payload = {"uid": user["uid"], "fromCurrency": from_currency, "toCurrency": to_currency, "amount": amount, "toDigital": True}
+                quote = timed(session, "homedelivery_quote", "POST", "/api/homedelivery", json=payload, headers=headers)
+                if operation == "confirm" and quote is not None and quote.status_code == 200:
+                    token = quote.json().get("data", {}).get("quoteToken")
+                    confirm = dict(payload, confirm=True, **({"quoteToken": token} if token else {}))
+                    timed(session, "homedelivery_confirm", "POST", "/api/homedelivery", json=confirm, headers=headers)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted operations, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="seconds added by the stub upstreams")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--mongomock", action="store_true", help="run the server on mongomock instead of MONGO_URI")
+    parser.add_argument("--base-url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    mix = {}
+    for entry in args.mix.split(","):
+        name, weight = entry.split("=")
+        mix[name.strip()] = float(weight)
+
+    stub, stub_url = start_stub(args.upstream_latency)
+    process = None
+    workdir = tempfile.mkdtemp(prefix="paytrue-bench-")
+    try:
+        if args.base_url:
+            base_url = args.base_url
+        else:
+            process, base_url = start_server(args, stub_url, workdir)
+        users = register_users(base_url, args.users)
+
+        levels = {}
+        for concurrency in args.concurrency:
+            levels[str(concurrency)] = run_level(base_url, users, concurrency, args.duration, mix)
+            print(f"\nconcurrency {concurrency}")
+            for endpoint, stats in levels[str(concurrency)].items():
+                print(f"  {endpoint:22} {stats['rps']:>9.1f} req/s  p50 {stats['p50_ms']:>8.1f}ms  p95 {stats['p95_ms']:>8.1f}ms  p99 {stats['p99_ms']:>8.1f}ms  errors {stats['errors']}")
+
+        report = {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                "duration": args.duration, "users": args.users, "mix": mix,
+                "upstreamLatency": args.upstream_latency, "mongomock": args.mongomock,
+            },
+            "levels": levels,
+        }
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+        print(f"\nResults written to {args.output}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(10)
+        stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+    Starts app.py for benchmarking, optionally against mongomock instead of a
+    real MongoDB. Upstream URLs come from EXCHANGE_RATE_API_BASE and
+    JASWANTH_BACKEND, which benchmarks/loadtest.py points at its stubs.
+
+        python benchmarks/server.py --port 8090 --mongomock
+        python benchmarks/server.py --port 8090 --gunicorn --workers 4 --threads 8
+'''
+import argparse, os, sys #type: ignore
+
+FILES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_ENV = {
+    "MONGO_URI": "mongodb://127.0.0.1:27017",
+    "MONGO_DB": "paytrue_bench",
+    "MONGO_COLLECTION_USERS": "users",
+    "MONGO_COLLECTION_WALLETS": "wallets",
+    "MONGO_COLLECTION_GLOBALWALLETS": "globalwallets",
+    "MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS": "moneywithdrawltransactions",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory mongomock client")
+    parser.add_argument("--gunicorn", action="store_true", help="serve through gunicorn.conf.py instead of the development server")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    for name, value in BENCH_ENV.items():
+        os.environ.setdefault(name, value)
+
+    if args.gunicorn:
+        # mongomock keeps data in process memory, so worker processes would not share it
+        if args.mongomock:
+            parser.error("--gunicorn needs a real MongoDB; mongomock is per process")
+        os.environ.update(GUNICORN_BIND=f"{args.host}:{args.port}", WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads))
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", os.path.join(FILES_DIR, "gunicorn.conf.py"), "--pythonpath", FILES_DIR])
+
+    if args.mongomock:
+        import mongomock #type: ignore
+        import pymongo #type: ignore
+        pymongo.MongoClient = mongomock.MongoClient
+
+    sys.path.insert(0, FILES_DIR)
+    from app import app #type: ignore
+    app.run(host=args.host, port=args.port, threaded=True, debug=False, use_reloader=False)
+
+
+if __name__ == '__main__':
+    main()
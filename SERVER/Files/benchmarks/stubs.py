@@ -0,0 +1,76 @@
+'''
+    Local stand-ins for the server's upstreams, used by the benchmarks:
+    exchangerate-api (/v6/<key>/latest/<base>, /v6/<key>/pair/<from>/<to>) and
+    the JASWANTH_BACKEND OCR/KYC service (/api/fetchDetails, /api/generate_code).
+    Every response is delayed by a configurable latency.
+'''
+import json, random, threading, time #type: ignore
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer #type: ignore
+
+# Units per 1 USD
+USD_RATES = {"USD": 1.0, "INR": 83.1, "EUR": 0.92, "GBP": 0.79, "JPY": 149.5, "CNY": 7.24}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 4 and parts[0] == "v6" and parts[2] == "latest":
+            base = parts[3]
+            if base not in USD_RATES:
+                return self._send({"result": "error", "error-type": "unsupported-code"}, 404)
+            rates = {c: r / USD_RATES[base] for c, r in USD_RATES.items()}
+            return self._send({"result": "success", "base_code": base, "conversion_rates": rates})
+        if len(parts) == 5 and parts[0] == "v6" and parts[2] == "pair":
+            base, target = parts[3], parts[4]
+            if base not in USD_RATES or target not in USD_RATES:
+                return self._send({"result": "error", "error-type": "unsupported-code"}, 404)
+            return self._send({"result": "success", "conversion_rate": USD_RATES[target] / USD_RATES[base]})
+        if self.path.startswith("/api/generate_code"):
+            return self._send({"verification_code": f"{random.randrange(10 ** 6):06d}"})
+        self._send({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(self.latency)
+        if self.path.startswith("/api/fetchDetails"):
+            return self._send({"status": "success", "details": {"address": "221B Baker Street, London"}})
+        self._send({"error": "not found"}, 404)
+
+
+def start_stub(latency=0.0, host="127.0.0.1", port=0):
+    # Returns (server, base_url); the server runs on a daemon thread
+    handler = type("LatencyStubHandler", (StubHandler,), {"latency": latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the upstream stubs standalone")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every response")
+    args = parser.parse_args()
+    server, url = start_stub(args.latency, port=args.port)
+    print(f"Stub upstreams on {url} (latency {args.latency}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
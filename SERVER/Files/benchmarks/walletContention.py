@@ -0,0 +1,75 @@
+'''
+    Concurrent same-user transfer benchmark for homeDelivery.
+
+    Creates a throwaway user and wallet in the configured MONGO_DB, fires
+    confirmed wallet-to-wallet conversions from many threads at once and
+    reports throughput plus the number of lost updates (the difference between
+    the expected and the stored fromCurrency balance).
+
+    Run it from SERVER/Files against a local MongoDB, once on the commit before
+    a change and once after:
+
+        python benchmarks/walletContention.py --threads 16 --transfers 50
+'''
+import argparse, os, sys, threading, time #type: ignore
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contollers.auth import Authentication #type: ignore
+
+
+class FakeRequest:
+    def __init__(self, json):
+        self.json = json
+        # No Authorization header, so homeDelivery takes the database path
+        self.headers = {}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--transfers", type=int, default=50, help="transfers per thread")
+    parser.add_argument("--amount", type=float, default=1)
+    parser.add_argument("--rate", type=float, default=83.0)
+    args = parser.parse_args()
+
+    # Keep the run offline and deterministic
+    Authentication.get_exchange_rate = lambda from_currency, to_currency: args.rate
+
+    total = args.threads * args.transfers
+    start_balance = total * args.amount
+    user_id = Authentication.userCollection.insert_one({"name": "bench", "email": f"bench-{time.time()}@paytrue.local", "homeBank": []}).inserted_id
+    uid = str(user_id)
+    Authentication.walletStore.create(uid, {"USD": start_balance, "INR": 0})
+
+    ok = [0]
+    lock = threading.Lock()
+    payload = {"uid": uid, "fromCurrency": "USD", "toCurrency": "INR", "amount": args.amount, "toDigital": True, "confirm": True}
+
+    def worker():
+        for _ in range(args.transfers):
+            _, status = Authentication.homeDelivery(FakeRequest(payload))
+            if status == 200:
+                with lock:
+                    ok[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    balances = Authentication.walletStore.find(uid).balances
+    expected_usd = start_balance - ok[0] * args.amount
+    print(f"transfers: {total}  succeeded: {ok[0]}  elapsed: {elapsed:.3f}s  throughput: {total / elapsed:.1f} req/s")
+    print(f"USD stored: {balances['USD']}  expected: {expected_usd}  lost updates: {round((balances['USD'] - expected_usd) / args.amount)}")
+
+    Authentication.walletCollection.delete_one({"uid": uid})
+    Authentication.userCollection.delete_one({"_id": user_id})
+    Authentication.moneyWithdrawlTransactionsCollection.delete_many({"uid": uid})
+
+
+if __name__ == '__main__':
+    main()
@@ -1,61 +1,222 @@
-from pymongo import MongoClient #type: ignore
 from bson import ObjectId #type: ignore
-from dotenv import load_dotenv #type: ignore
-import os,requests #type: ignore
-from datetime import datetime #type: ignore
-
-load_dotenv()
+import os,json,base64,time,threading #type: ignore
+from datetime import datetime,timezone #type: ignore
+from contollers.utils.Cache import TTLCache
+from contollers.utils.RateTable import RateTable,WALLET_CURRENCIES
+from contollers.utils.HttpClient import httpClient
+from contollers.utils.CircuitBreaker import CircuitOpenError
+from contollers.utils.CodePool import CodePool
+from contollers.utils.Metrics import registry
+from contollers.utils.Json import dumps_bytes
+from contollers.utils.UploadStore import UploadStore
+from contollers.utils.ImagePrep import ocr_derivative
+from contollers.utils.Tokens import TokenSigner,TokenError,load_keys
+from contollers.utils.GlobalLedger import GlobalLedger,GlobalWalletError
+from contollers.db.Database import ping,userCollection,walletCollection,globalWalletCollection,moneyWithdrawlTransactionsCollection,redeemedQuoteCollection
+from contollers.db.Indexes import start_background_indexes,index_report
+from contollers.db.WalletStore import wallet_balance_list,check_currency
+from contollers.db.WalletMigration import start_background_migration
+from contollers.jobs.JobQueue import JobQueue,JobWorkers
+from contollers.auth.Session import SESSION_TTL,issue_session,session_user
+from contollers.db.Repository import (
+    walletStore,userCache,walletCache,find_user_profile,find_user_name,find_user_credentials,find_user_proofs,user_email_exists,
+    insert_user,push_home_bank,credit_home_bank,set_verified_address,find_wallet,invalidate_wallet,
+    insert_transaction,insert_transactions,find_transactions,find_existing_user_ids,find_wallets,
+    record_conversions,find_conversion_summary,invalidate_user,run_transaction,claim_quote,release_quote,
+)
 
 JASWANTH_BACKEND_URL = os.getenv("JASWANTH_BACKEND")
-mongo_uri = os.getenv("MONGO_URI")
-mongo_db = os.getenv("MONGO_DB")
-mongo_collection = os.getenv("MONGO_COLLECTION_USERS")
-mongo_collection_wallet = os.getenv("MONGO_COLLECTION_WALLETS")
-MONGO_COLLECTION_GLOBALWALLETS = os.getenv("MONGO_COLLECTION_GLOBALWALLETS")
-MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS = os.getenv("MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS")
-
-client = MongoClient(mongo_uri)
-db = client[mongo_db]
-userCollection = db[mongo_collection]
-walletCollection = db[mongo_collection_wallet]
-globalWalletCollection = db[MONGO_COLLECTION_GLOBALWALLETS]
-moneyWithdrawlTransactionsCollection = db[MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS]
+# The OCR backend processes two documents per call, so it gets a longer read timeout
+OCR_READ_TIMEOUT = float(os.getenv("OCR_READ_TIMEOUT", "60"))
+# For the same reason its circuit breaker only counts an OCR call as slow after OCR_SLOW_SECONDS
+httpClient.configure_breaker("ocr", slow_seconds=float(os.getenv("OCR_SLOW_SECONDS", "30")))
+# Document verification runs as background jobs; at most OCR_WORKERS OCR calls run at once per process
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "data/jobs.sqlite3")
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "4"))
+HOME_DELIVERY_BATCH_LIMIT = int(os.getenv("HOME_DELIVERY_BATCH_LIMIT", "100"))
+# /api/getkyccode hands out pre-fetched codes. The pool refills to KYC_CODE_POOL_HIGH
+# once it drops below KYC_CODE_POOL_LOW; KYC_CODE_TTL must stay below how long the
+# backend keeps a generated code valid.
+KYC_CODE_POOL = os.getenv("KYC_CODE_POOL", "true").lower() == "true"
+KYC_CODE_POOL_LOW = int(os.getenv("KYC_CODE_POOL_LOW", "5"))
+KYC_CODE_POOL_HIGH = int(os.getenv("KYC_CODE_POOL_HIGH", "20"))
+KYC_CODE_TTL = float(os.getenv("KYC_CODE_TTL", "300"))
+# A quote token carries the quoted rate so confirm can skip the rate fetch
+QUOTE_TTL = int(os.getenv("QUOTE_TTL", "60"))
+QUOTE_STORE_SIZE = int(os.getenv("QUOTE_STORE_SIZE", "100000"))
+quoteSigner = TokenSigner(*load_keys("QUOTE_TOKEN_KEYS", "QUOTE_TOKEN_ACTIVE_KEY"))
+# Ids of quotes already confirmed in this process, remembered until they would have
+# expired anyway. This only turns away repeats early; claim_quote records each
+# confirmation in MongoDB so a quote is redeemed once across all workers.
+redeemedQuotes = TTLCache("quote", ttl=QUOTE_TTL, maxsize=QUOTE_STORE_SIZE)
+
+indexedCollections = {
+    "users": userCollection,
+    "wallets": walletCollection,
+    "transactions": moneyWithdrawlTransactionsCollection,
+    "globalWallet": globalWalletCollection,
+    "redeemedQuotes": redeemedQuoteCollection,
+}
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "true").lower() == "true"
+WALLET_MIGRATION_ON_STARTUP = os.getenv("WALLET_MIGRATION_ON_STARTUP", "false").lower() == "true"
+
+GLOBAL_WALLET_SHARDS = int(os.getenv("GLOBAL_WALLET_SHARDS", "8"))
+globalLedger = GlobalLedger(globalWalletCollection, shards=GLOBAL_WALLET_SHARDS)
 
 
 
 PHOTOGRAPH_UPLOAD_FOLDER = 'uploads/photographs'
-if not os.path.exists(PHOTOGRAPH_UPLOAD_FOLDER):
-    os.makedirs(PHOTOGRAPH_UPLOAD_FOLDER)
-
 IDPROOF_UPLOAD_FOLDER = 'uploads/idproofs'
-if not os.path.exists(IDPROOF_UPLOAD_FOLDER):
-    os.makedirs(IDPROOF_UPLOAD_FOLDER)
-
 ADDRESSPROOF_UPLOAD_FOLDER = 'uploads/addressproofs'
-if not os.path.exists(ADDRESSPROOF_UPLOAD_FOLDER):
-    os.makedirs(ADDRESSPROOF_UPLOAD_FOLDER)
+UPLOAD_FOLDERS = (PHOTOGRAPH_UPLOAD_FOLDER, IDPROOF_UPLOAD_FOLDER, ADDRESSPROOF_UPLOAD_FOLDER)
+
+uploadStore = UploadStore()
+
+
+EXCHANGE_RATE_TTL = int(os.getenv("EXCHANGE_RATE_TTL", "300"))
+EXCHANGE_RATE_CACHE_SIZE = int(os.getenv("EXCHANGE_RATE_CACHE_SIZE", "64"))
+EXCHANGE_RATE_BASE = os.getenv("EXCHANGE_RATE_BASE", "USD")
+# Replace with your API key
+EXCHANGE_RATE_API_KEY = os.getenv("EXCHANGE_RATE_API_KEY", "b60a8af8d0f11331471da969")
+EXCHANGE_RATE_API_BASE = os.getenv("EXCHANGE_RATE_API_BASE", "https://v6.exchangerate-api.com")
+EXCHANGE_RATE_API_URL = f"{EXCHANGE_RATE_API_BASE}/v6/{EXCHANGE_RATE_API_KEY}"
+exchangeRateCache = TTLCache("exchange_rate", ttl=EXCHANGE_RATE_TTL, maxsize=EXCHANGE_RATE_CACHE_SIZE)
+# Last successfully fetched table and pair rates, served while the API is failing
+# (or its circuit is open) for at most EXCHANGE_RATE_MAX_STALENESS seconds
+EXCHANGE_RATE_MAX_STALENESS = int(os.getenv("EXCHANGE_RATE_MAX_STALENESS", "3600"))
+lastGoodRates = {}
+staleRatesServed = registry.counter("exchange_rate_stale_served_total", "Rates served from the last good value while the API was unavailable.", ("kind",))
+
+
+def fetch_rate_table(base):
+    # One call returns every rate for the base currency
+    response = httpClient.get("exchangerate", f"{EXCHANGE_RATE_API_URL}/latest/{base}")
+    data = response.json()
+
+    if response.status_code == 200 and data.get("result") == "success":
+        return RateTable.from_base_rates(base, data["conversion_rates"])
+    else:
+        raise ValueError(f"Failed to fetch rate table: {data.get('error-type', 'Unknown error')}")
+
+def fetch_exchange_rate(from_currency, to_currency):
+    response = httpClient.get("exchangerate", f"{EXCHANGE_RATE_API_URL}/pair/{from_currency}/{to_currency}")
+    data = response.json()
+
+    # Check if the response is successful
+    if response.status_code == 200 and data.get("result") == "success":
+        return data["conversion_rate"]
+    else:
+        raise ValueError(f"Failed to fetch exchange rate: {data.get('error-type', 'Unknown error')}")
+
+def load_rate(key, fetch):
+    def fetch_and_remember():
+        value = fetch()
+        lastGoodRates[key] = (value, time.monotonic())
+        return value
 
+    try:
+        return exchangeRateCache.get_or_load(key, fetch_and_remember)
+    except Exception as e:
+        last = lastGoodRates.get(key)
+        if last is None or time.monotonic() - last[1] > EXCHANGE_RATE_MAX_STALENESS:
+            raise
+        print(f"Serving {time.monotonic() - last[1]:.0f}s old rate for {key}: {e}")
+        staleRatesServed.inc(key[0] if key[0] == "table" else "pair")
+        return last[0]
+
+def get_rate_table():
+    # Shared cross-rate table for the wallet currencies, refreshed once per TTL
+    key = ("table", EXCHANGE_RATE_BASE)
+    return load_rate(key, lambda: fetch_rate_table(EXCHANGE_RATE_BASE))
 
 def get_exchange_rate(from_currency, to_currency):
     try:
-        # Replace with your API key
-        api_key = "b60a8af8d0f11331471da969"
-        url = f"https://v6.exchangerate-api.com/v6/{api_key}/pair/{from_currency}/{to_currency}"
-
-        # Make the API call
-        response = requests.get(url)
-        data = response.json()
-
-        # Check if the response is successful
-        if response.status_code == 200 and data.get("result") == "success":
-            return data["conversion_rate"]
-        else:
-            raise ValueError(f"Failed to fetch exchange rate: {data.get('error-type', 'Unknown error')}")
+        from_currency = from_currency.upper()
+        to_currency = to_currency.upper()
+        if from_currency in WALLET_CURRENCIES and to_currency in WALLET_CURRENCIES:
+            return get_rate_table().rate(from_currency, to_currency)
+
+        # Currencies outside the table fall back to a cached per-pair lookup.
+        # Concurrent misses for the same pair share a single upstream call
+        key = (from_currency, to_currency)
+        return load_rate(key, lambda: fetch_exchange_rate(*key))
     except Exception as e:
         print(f"Error fetching exchange rate: {str(e)}")
         # Fallback to a default exchange rate or raise an error
         raise ValueError("Could not retrieve exchange rate. Please try again later.")
 
+def exchangeRateStats():
+    try:
+        return {"data": exchangeRateCache.stats(), "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def upstreamStats():
+    try:
+        return {"data": httpClient.stats(), "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def indexReport():
+    try:
+        return {"data": index_report(indexedCollections), "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def uploadStats():
+    try:
+        return {"data": uploadStore.stats(), "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def kycCodeStats():
+    try:
+        return {"data": kycCodes.stats(), "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def application_metrics():
+    # Exports the counters the caches, upload store and job queue already keep
+    families = []
+    caches = [cache.stats() for cache in (userCache, walletCache, exchangeRateCache, redeemedQuotes)]
+    for field, name, kind, help in (
+        ("hits", "cache_hits_total", "counter", "Cache lookups answered from memory."),
+        ("misses", "cache_misses_total", "counter", "Cache lookups that missed."),
+        ("evictions", "cache_evictions_total", "counter", "Entries evicted to stay under maxsize."),
+        ("loadSeconds", "cache_load_seconds_total", "counter", "Time spent in cache loaders."),
+        ("size", "cache_entries", "gauge", "Entries currently cached."),
+    ):
+        families.append((name, kind, help, [({"cache": stats["name"]}, stats[field]) for stats in caches]))
+
+    uploads = uploadStore.stats()
+    families.append(("upload_files_total", "counter", "Uploaded files stored.", [({}, uploads["uploads"])]))
+    families.append(("upload_bytes_total", "counter", "Uploaded bytes streamed to storage.", [({}, uploads["bytes"])]))
+    families.append(("upload_seconds_total", "counter", "Time spent storing uploads.", [({}, uploads["seconds"])]))
+
+    depth = verificationJobs.depth()
+    families.append(("jobs", "gauge", "Verification jobs by status.", [({"status": status}, count) for status, count in sorted(depth.items())]))
+    return families
+
+registry.register_collector(application_metrics)
+
+def cacheStats():
+    try:
+        data = []
+        for cache in (userCache, walletCache):
+            stats = cache.stats()
+            # Every hit is a find_one that never reached MongoDB
+            stats["roundTripsSaved"] = stats["hits"]
+            data.append(stats)
+        return {"data": data, "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
 def addUser(user_data):
     userFormData = user_data.form
     try:
@@ -68,31 +229,29 @@ def addUser(user_data):
         if missing_fields:
             return {"message": f"Missing required data: {', '.join(missing_fields)}"}, 400
         
-        photograph = user_data.files['photograph']
-        if photograph.filename == '':
+        # Validate every upload before touching the disk
+        photograph = user_data.files.get('photograph')
+        if photograph is None or photograph.filename == '':
             return {"error": "No photograph selected"}, 400
-        photographfilename = photograph.filename
-        photograph_file_path = os.path.join(PHOTOGRAPH_UPLOAD_FOLDER, photographfilename)
-        photograph.save(photograph_file_path)
 
-        idProof = user_data.files['idProof']
-        if idProof.filename == '':
+        idProof = user_data.files.get('idProof')
+        if idProof is None or idProof.filename == '':
             return {"error": "No ID Proof selected"}, 400
-        idProoffilename = idProof.filename
-        idProof_file_path = os.path.join(IDPROOF_UPLOAD_FOLDER, idProoffilename)
-        idProof.save(idProof_file_path)
-        
-        addressProof = user_data.files['addressProof']
-        if addressProof.filename == '':
+
+        addressProof = user_data.files.get('addressProof')
+        if addressProof is None or addressProof.filename == '':
             return {"error": "No Address Proof selected"}, 400
-        addressProoffilename = addressProof.filename
-        addressProof_file_path = os.path.join(ADDRESSPROOF_UPLOAD_FOLDER, addressProoffilename)
-        addressProof.save(addressProof_file_path)
 
-        # Check if user already exists
-        alreadyExists = userCollection.find_one({'email': userFormData['email']})
-        if alreadyExists:
+        # Check if user already exists, so rejected signups cost no disk writes
+        if user_email_exists(userFormData['email']):
             return {"message": "User already exists","success":False}, 400
+
+        # Stream the three files to content-addressed storage in parallel
+        photographfilename, idProoffilename, addressProoffilename = uploadStore.save_many([
+            (photograph, PHOTOGRAPH_UPLOAD_FOLDER),
+            (idProof, IDPROOF_UPLOAD_FOLDER),
+            (addressProof, ADDRESSPROOF_UPLOAD_FOLDER),
+        ])
         
         # Prepare the user data for insertion
         finalUserData = {
@@ -117,9 +276,9 @@ def addUser(user_data):
 
 
         # Insert user data into the database
-        result = userCollection.insert_one(finalUserData)
+        result = insert_user(finalUserData)
 
-        walletResult = walletCollection.insert_one({"uid": str(result.inserted_id), "balance": [{"amount": 2000, "currency": "INR"}, {"amount": 400, "currency": "USD"}, {"amount": 300, "currency": "EUR"}, {"amount": 200, "currency": "GBP"}, {"amount": 100, "currency": "JPY"}, {"amount": 50, "currency": "CNY"}]})
+        walletResult = walletStore.create(str(result.inserted_id), {"INR": 2000, "USD": 400, "EUR": 300, "GBP": 200, "JPY": 100, "CNY": 50})
 
         finalUserData['id'] = str(result.inserted_id)
         finalUserData['walletId'] = str(walletResult.inserted_id)
@@ -141,34 +300,45 @@ def loginUser(email,password):
     if email is None or password is None:
         return {"message": "Missing email or password"}, 400
 
-    user = userCollection.find_one({'email': email})
+    user = find_user_credentials(email)
     if not user:
         return {"message": "User not found","success":False}, 404
     
-    if user['password']!= password:
+    if user.password != password:
         return {"message": "Incorrect password","success":False}, 401
     
     user_data = {
         "success":True,
-        "uid": str(user['_id']), 
+        "uid": str(user.id), 
+        "token": issue_session(str(user.id), user.name),
+        "expiresAt": int(time.time() + SESSION_TTL),
         "Message": "Successfully Login!",
     }
     return user_data, 200
 
-def verifyUser(id):
+def verifyUser(id, session=None):
+    # A session token for this uid answers without touching the database
+    if session and session["uid"] == id:
+        return {
+            "uid": id,
+            "Message": "User verified successfully",
+            "success": True,
+            "fullName": session["name"]
+        }, 200
+
     try:
         object_id = ObjectId(id)
     except:
         return {"message": "Invalid user ID format"}, 400
     
-    user = userCollection.find_one({'_id': object_id})
+    user = find_user_name(object_id)
     if not user:
         return {"message": "User not found"}, 404
     user_data ={
-        "uid": str(user['_id']),
+        "uid": str(user.id),
         "Message": "User verified successfully",
         "success": True,
-        "fullName": user['name']
+        "fullName": user.name
     }
     return user_data, 200
 
@@ -176,57 +346,163 @@ def verifyUser(id):
 def parseUserData(id):
     try:
         object_id = ObjectId(id)
-        user = userCollection.find_one({'_id': object_id})
-        if not user:
+    except Exception:
+        return {"message": "Invalid user ID format"}, 400
+    try:
+        if not find_user_proofs(object_id):
             return {"message": "User not found"}, 404
 
-        addressProof_file_path = "uploads/addressproofs/" + user['addressProofPath']
-        idProof_file_path = "uploads/idproofs/" + user['idProofPath']
+        # Don't queue work the OCR backend is known to be unable to take
+        if httpClient.breaker("ocr").is_open():
+            return {"message": "Document verification is temporarily unavailable, please try again later", "success": False}, 503
+
+        # A user with verification already in flight gets the existing job back
+        job, created = verificationJobs.enqueue("verifyDocuments", {"uid": str(object_id)}, dedupe_key=f"verifyDocuments:{object_id}")
+        if created:
+            verificationWorkers.start()
+            verificationWorkers.notify()
+        return {
+            "message": "Verification queued" if created else "Verification already in progress",
+            "jobId": job["id"],
+            "status": job["status"],
+            "success": True
+        }, 202
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return {"error": str(e), "success": False}, 500
 
-        user_data = {
-            "uid": str(user['_id'])
+def verificationStatus(job_id):
+    try:
+        job = verificationJobs.get(job_id) if job_id else None
+        if not job:
+            return {"message": "Job not found"}, 404
+        data = {
+            "jobId": job["id"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "attempts": job["attempts"],
         }
+        if job["status"] == "succeeded":
+            data["result"] = job["result"]["response"]
+            data["resultStatus"] = job["result"]["statusCode"]
+        elif job["status"] == "failed":
+            data["error"] = job["error"]
+        return {"data": data, "success": True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
 
-        # Open the files in binary mode
-        with open(addressProof_file_path, 'rb') as address_proof_file, open(idProof_file_path, 'rb') as id_proof_file:
-            files = {
-                'file1': address_proof_file,
-                'file2': id_proof_file
-            }
-            FILE_UPLOAD_URL = JASWANTH_BACKEND_URL + "/api/fetchDetails"
-            response = requests.post(FILE_UPLOAD_URL, data=user_data, files=files)
-
-        # Check if the response is successful
-        if response.ok:
-            response_data = response.json()
-            if response_data.get("status") == "success":
-                # Extract the new address from the response
-                new_address = response_data.get("details", {}).get("address")
-                
-                if new_address:
-                    # Update the user's address in the database
-                    userCollection.update_one(
-                        {'_id': object_id},
-                        {'$set': {'address': new_address,"verified":True}}
-                    )
-                    print(f"User address updated to: {new_address}")
-
-                # Return the updated data
-                return {
-                    "message": "User data updated successfully",
-                    "data": response_data
-                }, 200
-            else:
-                return {
-                    "message": "Verification failed",
-                    "details": response_data.get("message", "Unknown error")
-                }, 400
-        else:
-            return {"message": "Failed to send files"}, response.status_code
+def verify_user_documents(job, report_progress):
+    object_id = ObjectId(job["payload"]["uid"])
+    user = find_user_proofs(object_id)
+    if not user:
+        return {"response": {"message": "User not found"}, "statusCode": 404}
+
+    report_progress("preprocessing")
+    # Send downscaled grayscale derivatives, generated once and cached next to the originals
+    addressProof_file_path = ocr_derivative(os.path.join(ADDRESSPROOF_UPLOAD_FOLDER, user.addressProofPath))
+    idProof_file_path = ocr_derivative(os.path.join(IDPROOF_UPLOAD_FOLDER, user.idProofPath))
+    upload_bytes = os.path.getsize(addressProof_file_path) + os.path.getsize(idProof_file_path)
+
+    user_data = {
+        "uid": str(user.id)
+    }
 
+    report_progress("uploading")
+    started = time.perf_counter()
+    # Open the files in binary mode
+    with open(addressProof_file_path, 'rb') as address_proof_file, open(idProof_file_path, 'rb') as id_proof_file:
+        files = {
+            'file1': address_proof_file,
+            'file2': id_proof_file
+        }
+        FILE_UPLOAD_URL = JASWANTH_BACKEND_URL + "/api/fetchDetails"
+        response = httpClient.post("ocr", FILE_UPLOAD_URL, data=user_data, files=files, timeout=(httpClient.timeout[0], OCR_READ_TIMEOUT))
+    print(f"OCR upload for {user.id}: {upload_bytes} bytes in {time.perf_counter() - started:.3f}s")
+
+    # Check if the response is successful
+    if not response.ok:
+        return {"response": {"message": "Failed to send files"}, "statusCode": response.status_code}
+
+    report_progress("applying")
+    response_data = response.json()
+    if response_data.get("status") != "success":
+        return {"response": {"message": "Verification failed", "details": response_data.get("message", "Unknown error")}, "statusCode": 400}
+
+    # Extract the new address from the response
+    new_address = response_data.get("details", {}).get("address")
+    if new_address:
+        # Update the user's address in the database
+        set_verified_address(object_id, new_address)
+        print(f"User address updated to: {new_address}")
+
+    return {"response": {"message": "User data updated successfully", "data": response_data}, "statusCode": 200}
+
+verificationJobs = JobQueue(JOB_QUEUE_PATH)
+verificationWorkers = JobWorkers(verificationJobs, {"verifyDocuments": verify_user_documents}, concurrency=OCR_WORKERS)
+
+
+# Setup that used to run at import now runs once per process, on the first
+# request that needs it, so workers boot quickly and a forked process never
+# inherits the parent's connections or threads.
+_preparedPid = None
+_prepareLock = threading.Lock()
+# Outcome of this process's index creation, reported by /readyz
+indexStatus = {}
+
+def prepare_process():
+    global _preparedPid
+    if _preparedPid == os.getpid():
+        return
+    with _prepareLock:
+        if _preparedPid == os.getpid():
+            return
+        for folder in UPLOAD_FOLDERS:
+            os.makedirs(folder, exist_ok=True)
+        # Index creation talks to MongoDB, so it runs in the background: an outage
+        # must not hold this lock and stall requests that never touch the database
+        if ENSURE_INDEXES:
+            start_background_indexes(indexedCollections, indexStatus)
+        if WALLET_MIGRATION_ON_STARTUP:
+            start_background_migration(walletCollection, batch_size=int(os.getenv("WALLET_MIGRATION_BATCH", "500")))
+        # Pick up jobs that were still queued when the server last stopped
+        verificationWorkers.start()
+        if KYC_CODE_POOL:
+            kycCodes.start()
+        _preparedPid = os.getpid()
+
+def readiness():
+    # Ready once this process is prepared and MongoDB, the job queue and the
+    # upload folders are all usable
+    checks = {}
+    try:
+        prepare_process()
+        checks["startup"] = "ok"
     except Exception as e:
-        print(f"Error: {e}")
-        return {"message": "Invalid user ID format"}, 400
+        checks["startup"] = str(e)
+    try:
+        ping()
+        checks["mongo"] = "ok"
+        if ENSURE_INDEXES and indexStatus.get("retry"):
+            # The first attempt ran during an outage; MongoDB is back, so try again
+            start_background_indexes(indexedCollections, indexStatus)
+    except Exception as e:
+        checks["mongo"] = str(e)
+    try:
+        verificationJobs.depth()
+        checks["jobQueue"] = "ok"
+    except Exception as e:
+        checks["jobQueue"] = str(e)
+    unwritable = [folder for folder in UPLOAD_FOLDERS if not os.access(folder, os.W_OK)]
+    checks["uploads"] = f"not writable: {', '.join(unwritable)}" if unwritable else "ok"
+
+    ready = all(result == "ok" for result in checks.values())
+    if not ready:
+        print(f"Readiness check failed: {checks}")
+    # Reported but not required: a failed unique index (e.g. duplicate emails)
+    # needs fixing by hand and should not take the instance out of rotation
+    return {"ready": ready, "checks": checks, "indexes": dict(indexStatus)}, 200 if ready else 503
 
 
 def addHomeBranch(data):
@@ -242,7 +518,7 @@ def addHomeBranch(data):
             return {"message": f"Missing required data: {', '.join(missing_fields)}"}, 400
         
         object_id = ObjectId(user_data['uid'])
-        user = userCollection.find_one({'_id': object_id})
+        user = find_user_profile(object_id)
         if not user:
             return {"message": "User not found"}, 404
         
@@ -252,7 +528,7 @@ def addHomeBranch(data):
             "accountHolderName": user_data['accountHolderName'],
             "balance": 9000,
         }
-        userCollection.update_one({'_id': object_id}, {'$push': {'homeBank': homeBank}})
+        push_home_bank(object_id, homeBank)
         
         return {"message": "Home branch added successfully","success":True}, 200
     
@@ -263,11 +539,11 @@ def addHomeBranch(data):
 def getBanks(uid):
     try:
         object_id = ObjectId(uid)
-        user = userCollection.find_one({'_id': object_id})
+        user = find_user_profile(object_id)
         if not user:
             return {"message": "User not found"}, 400
         
-        return {"data": user['homeBank'],"success":True}, 200
+        return {"data": user.homeBank,"success":True}, 200
     
     except Exception as e:
         print(e)
@@ -276,16 +552,60 @@ def getBanks(uid):
 
 def globalWallet():
     try:
-        count = globalWalletCollection.count_documents({})
-        if count > 0:
+        initial_balances = [(currency, 100000000000000) for currency in WALLET_CURRENCIES]
+        if not globalLedger.bootstrap(initial_balances):
             return {"message": "Global Wallet already exists","success":False}, 400
-        else:
-            globalWallet = globalWalletCollection.insert_one({"balance": [{"amount": 100000000000000, "currency": "INR"}, {"amount": 100000000000000, "currency": "USD"}, {"amount": 100000000000000, "currency": "EUR"}, {"amount": 100000000000000, "currency": "GBP"}, {"amount": 100000000000000, "currency": "JPY"}, {"amount": 100000000000000, "currency": "CNY"}]})
-            return {"message": "Global Wallet created successfully","success":True}, 200
+        return {"message": "Global Wallet created successfully","success":True}, 200
+    except Exception as e:
+        print(e)
+        return {"error": str(e),"success":False}, 500
+
+def globalBalance():
+    try:
+        balances = globalLedger.balances()
+        if not balances:
+            return {"message": "Global Wallet not found"}, 404
+        return {"data": balances,"success":True}, 200
     except Exception as e:
         print(e)
         return {"error": str(e),"success":False}, 500
 
+def issue_quote(uid, from_currency, to_currency, amount, exchange_rate):
+    quote_id = ObjectId()
+    token = quoteSigner.sign({"qid": str(quote_id), "uid": uid, "from": from_currency, "to": to_currency, "amount": amount, "rate": exchange_rate}, QUOTE_TTL)
+    return token, int(time.time() + QUOTE_TTL)
+
+def redeem_quote(token, uid, from_currency, to_currency, amount):
+    # Returns (quoted rate, quote id), or raises TokenError when the token does
+    # not cover this exact conversion, has expired or was already confirmed.
+    # The quote is claimed before the wallet is debited so two confirms cannot
+    # both use it; unredeem_quote gives it back if the conversion then fails.
+    quote = quoteSigner.verify(token)
+    if (quote.get("uid"), quote.get("from"), quote.get("to"), quote.get("amount")) != (uid, from_currency, to_currency, amount):
+        raise TokenError("Quote does not match this conversion")
+    quote_id = quote["qid"]
+    if not redeemedQuotes.add(quote_id, True):
+        raise TokenError("Quote already used")
+    try:
+        claimed = claim_quote(quote_id, uid, datetime.fromtimestamp(quote["exp"], timezone.utc))
+    except Exception:
+        # Never recorded, so a retry with the same token must still work
+        redeemedQuotes.invalidate(quote_id)
+        raise
+    if not claimed:
+        raise TokenError("Quote already used")
+    return quote["rate"], quote_id
+
+def unredeem_quote(quote_id):
+    # Best effort: a quote that stays claimed only means the user asks for a new one
+    if quote_id is None:
+        return
+    try:
+        release_quote(quote_id)
+        redeemedQuotes.invalidate(quote_id)
+    except Exception as e:
+        print(f"Could not release quote {quote_id}: {e}")
+
 def homeDelivery(request):
     try:
         user_data = request.json
@@ -309,40 +629,66 @@ def homeDelivery(request):
         to_digital = user_data["toDigital"]
         confirm = user_data.get("confirm", False)  # Optional parameter for confirmation
 
+        # Reject bad codes before they reach the rate API or the wallet update
+        try:
+            check_currency(from_currency)
+            check_currency(to_currency)
+        except ValueError as e:
+            print(e)
+            return {"message": str(e)}, 400
+
         if amount <= 0:
             print("Amount must be greater than 0")
             return {"message": "Amount must be greater than 0"}, 400
 
         object_id = ObjectId(uid)
-        user = userCollection.find_one({'_id': object_id})
-        if not user:
-            print("User not found")
-            return {"message": "User not found"}, 404
-
-        wallet = walletCollection.find_one({'uid': str(user['_id'])})
+        user_id = str(object_id)
+        # The session token already proves the user exists
+        if not session_user(request, user_id):
+            user = find_user_profile(object_id)
+            if not user:
+                print("User not found")
+                return {"message": "User not found"}, 404
+
+        wallet = find_wallet(user_id)
         if not wallet:
             print("Wallet not found")
             return {"message": "Wallet not found"}, 404
 
-        # Find the balance object for the fromCurrency
-        from_currency_balance = next((b for b in wallet['balance'] if b['currency'] == from_currency), None)
-        if not from_currency_balance:
+        # Find the balance for the fromCurrency
+        from_currency_balance = wallet.balances.get(from_currency)
+        if from_currency_balance is None:
             print(f"{from_currency} balance not found in wallet")
             return {"message": f"{from_currency} balance not found in wallet"}, 400
 
         # Check if there is sufficient balance
-        if from_currency_balance['amount'] < amount:
+        if from_currency_balance < amount:
+            # The wallet may have come from the cache; make the next attempt read it fresh
+            invalidate_wallet(wallet.uid)
             print(f"Insufficient balance in {from_currency}")
             return {"message": f"Insufficient balance in {from_currency}"}, 400
 
-        # Fetch the exchange rate (mocked or from an external API)
-        exchange_rate = get_exchange_rate(from_currency, to_currency)  # Assume this function exists
+        quote_token = user_data.get("quoteToken")
+        quote_id = None
+        if confirm and quote_token:
+            # Confirm at the quoted rate without fetching it again
+            try:
+                exchange_rate, quote_id = redeem_quote(quote_token, uid, from_currency, to_currency, amount)
+            except TokenError as e:
+                print(f"Quote rejected: {e}")
+                return {"message": f"Invalid quote: {e}. Please request a new quote", "success": False}, 400
+        else:
+            # Fetch the exchange rate (mocked or from an external API)
+            exchange_rate = get_exchange_rate(from_currency, to_currency)
         to_amount = amount * exchange_rate
 
         # If `confirm` is False, return the exchange rate details without processing the transaction
         if not confirm:
+            quote_token, quote_expires_at = issue_quote(uid, from_currency, to_currency, amount, exchange_rate)
             return {
                 "data": {
+                    "quoteToken": quote_token,
+                    "quoteExpiresAt": quote_expires_at,
                     "exchangeRate": exchange_rate,
                     "fromCurrency": from_currency,
                     "fromAmount": amount,
@@ -355,38 +701,20 @@ def homeDelivery(request):
             }, 200
 
         # If `confirm` is True, proceed with the transaction
-        # Deduct the amount from the user's wallet
-        from_currency_balance['amount'] -= amount
-
-        # Update the wallet with the new balance
-        walletCollection.update_one(
-            {'_id': wallet['_id']},
-            {'$set': {'balance': wallet['balance']}}
-        )
-
-        # If the delivery is None, update the user's wallet with the converted amount
+        # If the delivery is None, debit fromCurrency and credit toCurrency in the user's wallet
         if delivery_address is None:
-            # Find or create the balance object for the toCurrency in the user's wallet
-            to_currency_balance = next(
-                (b for b in wallet['balance'] if b['currency'] == to_currency),
-                None
-            )
-            if not to_currency_balance:
-                to_currency_balance = {"currency": to_currency, "amount": 0}
-                wallet['balance'].append(to_currency_balance)
-
-            # Add the converted amount to the user's wallet's toCurrency balance
-            to_currency_balance['amount'] += to_amount
-
-            # Update the wallet with the new balance
-            walletCollection.update_one(
-                {'_id': wallet['_id']},
-                {'$set': {'balance': wallet['balance']}}
-            )
+            # Debit and credit in one conditional update that only applies while the balance suffices
+            transferred = walletStore.transfer(wallet, from_currency, amount, to_currency, to_amount)
+            invalidate_wallet(wallet.uid)
+            if not transferred:
+                # The quote was not used up; it stays valid for a retry
+                unredeem_quote(quote_id)
+                print(f"Insufficient balance in {from_currency}")
+                return {"message": f"Insufficient balance in {from_currency}"}, 400
 
             # Log the transaction in the moneyWithdrawlTransactionsCollection
-            transaction_id = moneyWithdrawlTransactionsCollection.insert_one({
-                "uid": str(user['_id']),
+            transaction = {
+                "uid": user_id,
                 "fromCurrency": from_currency,
                 "toCurrency": to_currency,
                 "fromAmount": amount,
@@ -400,7 +728,9 @@ def homeDelivery(request):
                 "type": "homeDelivery",
                 "delivered": True if delivery_address else False,
                 "confirmed": True
-            }).inserted_id
+            }
+            transaction_id = insert_transaction(transaction).inserted_id
+            record_conversions([transaction])
 
             return {
                 "message": f"{amount} {from_currency} converted to {round(to_amount, 2)} {to_currency} in user's wallet",
@@ -408,52 +738,37 @@ def homeDelivery(request):
                 "success": True
             }, 200
 
-        # If delivery is provided, proceed with updating the global wallet
-        # Find the global wallet
-        global_wallet = globalWalletCollection.find_one({})
-        if not global_wallet:
-            print("Global Wallet not found")
-            return {"message": "Global Wallet not found"}, 500
-
-        # Find the balance object for the fromCurrency in the global wallet
-        global_from_currency_balance = next(
-            (b for b in global_wallet['balance'] if b['currency'] == from_currency),
-            None
-        )
-        
-        if not global_from_currency_balance:
-            print(f"{from_currency} balance not found in global wallet")
-            return {"message": f"{from_currency} balance not found in global wallet"}, 500
-
-        # Add the amount to the global wallet's corresponding fromCurrency balance
-        global_from_currency_balance['amount'] += amount
-
-        # Find the balance object for the toCurrency in the global wallet
-        global_to_currency_balance = next(
-            (b for b in global_wallet['balance'] if b['currency'] == to_currency),
-            None
-        )
-
-        if not global_to_currency_balance:
-            print(f"{to_currency} balance not found in global wallet")
-            return {"message": f"{to_currency} balance not found in global wallet"}, 500
-
-        # Subtract the converted amount from the global wallet's corresponding toCurrency balance
-        if global_to_currency_balance['amount'] < to_amount:
-            print(f"Insufficient balance in {to_currency} in global wallet")
-            return {"message": f"Insufficient balance in {to_currency} in global wallet"}, 400
-
-        global_to_currency_balance['amount'] -= to_amount
+        # If delivery is provided, deduct the amount from the user's wallet while the balance suffices
+        debited = walletStore.debit(wallet, from_currency, amount)
+        invalidate_wallet(wallet.uid)
+        if not debited:
+            unredeem_quote(quote_id)
+            print(f"Insufficient balance in {from_currency}")
+            return {"message": f"Insufficient balance in {from_currency}"}, 400
 
-        # Update the global wallet with the new balances
-        globalWalletCollection.update_one(
-            {'_id': global_wallet['_id']},
-            {'$set': {'balance': global_wallet['balance']}}
-        )
+        # Credit fromCurrency to the global wallet and debit the converted toCurrency,
+        # each on a single sub-ledger shard
+        try:
+            globalLedger.transfer(from_currency, amount, to_currency, to_amount)
+        except Exception as e:
+            # Whatever failed (including a database error), give the user back
+            # what was deducted above
+            try:
+                walletStore.credit(wallet, from_currency, amount)
+            except Exception as refund_error:
+                print(f"Refund of {amount} {from_currency} to {wallet.uid} failed: {refund_error}")
+                raise
+            finally:
+                invalidate_wallet(wallet.uid)
+            unredeem_quote(quote_id)
+            if not isinstance(e, GlobalWalletError):
+                raise
+            print(e.message)
+            return {"message": e.message}, e.status_code
 
         # Log the transaction in the moneyWithdrawlTransactionsCollection
-        transaction_id = moneyWithdrawlTransactionsCollection.insert_one({
-            "uid": str(user['_id']),
+        transaction = {
+            "uid": user_id,
             "fromCurrency": from_currency,
             "toCurrency": to_currency,
             "fromAmount": amount,
@@ -467,7 +782,9 @@ def homeDelivery(request):
             "type": "homeDelivery",
             "delivered": True,
             "confirmed": True
-        }).inserted_id
+        }
+        transaction_id = insert_transaction(transaction).inserted_id
+        record_conversions([transaction])
 
         return {
             "message": f"{amount} {from_currency} deducted successfully and added to the global wallet. {round(to_amount, 2)} {to_currency} deducted from the global wallet",
@@ -480,20 +797,241 @@ def homeDelivery(request):
         return {"error": str(e), "success": False}, 500
 
 
+def homeDeliveryBatch(request):
+    try:
+        user_data = request.json
+        if not user_data or not isinstance(user_data.get("items"), list) or not user_data["items"]:
+            return {"message": "No conversions provided"}, 400
+
+        items = user_data["items"]
+        confirm = user_data.get("confirm", False)
+        if len(items) > HOME_DELIVERY_BATCH_LIMIT:
+            return {"message": f"At most {HOME_DELIVERY_BATCH_LIMIT} conversions per batch"}, 400
+
+        results = [None] * len(items)
+        pending = []
+
+        # Validate every item up front
+        required_fields = ["uid", "fromCurrency", "toCurrency", "amount", "toDigital"]
+        for index, item in enumerate(items):
+            missing_fields = [field for field in required_fields if not isinstance(item, dict) or field not in item]
+            if missing_fields:
+                results[index] = {"index": index, "success": False, "message": f"Missing required data: {', '.join(missing_fields)}"}
+                continue
+            if item.get("delivery") is not None:
+                results[index] = {"index": index, "success": False, "message": "Delivery conversions are not supported in batches, use /api/homedelivery"}
+                continue
+            try:
+                object_id = ObjectId(item["uid"])
+                check_currency(item["fromCurrency"])
+                check_currency(item["toCurrency"])
+            except Exception as e:
+                results[index] = {"index": index, "success": False, "message": str(e)}
+                continue
+            if isinstance(item["amount"], bool) or not isinstance(item["amount"], (int, float)) or item["amount"] <= 0:
+                results[index] = {"index": index, "success": False, "message": "Amount must be greater than 0"}
+                continue
+            pending.append((index, object_id, item))
+
+        # One query for all users and one for all wallets
+        existing_users = find_existing_user_ids({object_id for _, object_id, _ in pending})
+        wallets = find_wallets({str(object_id) for object_id in existing_users})
+
+        # One rate table resolves every wallet-currency pair
+        rate_table = get_rate_table() if pending else None
+        rates = {}
+
+        # Simulate each wallet's items in order so later items see earlier ones
+        balances = {uid: dict(wallet.balances) for uid, wallet in wallets.items()}
+        accepted = {}
+        for index, object_id, item in pending:
+            uid = str(object_id)
+            from_currency, to_currency, amount = item["fromCurrency"], item["toCurrency"], item["amount"]
+            if object_id not in existing_users:
+                results[index] = {"index": index, "success": False, "message": "User not found"}
+                continue
+            if uid not in wallets:
+                results[index] = {"index": index, "success": False, "message": "Wallet not found"}
+                continue
+            if balances[uid].get(from_currency) is None:
+                results[index] = {"index": index, "success": False, "message": f"{from_currency} balance not found in wallet"}
+                continue
+            if balances[uid][from_currency] < amount:
+                results[index] = {"index": index, "success": False, "message": f"Insufficient balance in {from_currency}"}
+                continue
+
+            pair = (from_currency, to_currency)
+            if pair not in rates:
+                rates[pair] = rate_table.rate(*pair) if rate_table.has(from_currency) and rate_table.has(to_currency) else get_exchange_rate(*pair)
+            to_amount = amount * rates[pair]
+            balances[uid][from_currency] -= amount
+            balances[uid][to_currency] = balances[uid].get(to_currency, 0) + to_amount
+
+            results[index] = {
+                "index": index,
+                "success": True,
+                "data": {
+                    "exchangeRate": rates[pair],
+                    "fromCurrency": from_currency,
+                    "fromAmount": amount,
+                    "toCurrency": to_currency,
+                    "toAmount": round(to_amount, 2),
+                    "toDigital": item["toDigital"]
+                }
+            }
+            accepted.setdefault(uid, []).append((index, item, to_amount, rates[pair]))
+
+        if confirm and accepted:
+            apply_batch_conversions(wallets, accepted, results)
+
+        succeeded = sum(1 for result in results if result["success"])
+        return {
+            "data": {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded},
+            "success": True
+        }, 200
+
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
+def apply_batch_conversions(wallets, accepted, results):
+    # Net each wallet's accepted items into one guarded update and send them all
+    # in one bulk_write; the successful conversions are logged with insert_many.
+    batch_id = ObjectId()
+    operations, legacy = [], []
+    op_ids = {}
+    for uid, wallet_items in accepted.items():
+        wallet = wallets[uid]
+        if wallet.legacy:
+            legacy.append(uid)
+            continue
+        deltas = {}
+        for _, item, to_amount, _ in wallet_items:
+            deltas[item["fromCurrency"]] = deltas.get(item["fromCurrency"], 0) - item["amount"]
+            deltas[item["toCurrency"]] = deltas.get(item["toCurrency"], 0) + to_amount
+        op_ids[uid] = f"{batch_id}:{uid}"
+        operations.append(walletStore.batch_operation(wallet, deltas, op_ids[uid]))
+
+    applied = set()
+    if operations:
+        result = walletStore.bulk_write(operations)
+        if result.matched_count == len(operations):
+            applied = set(op_ids)
+        else:
+            # A concurrent write beat the guard on some wallets: find out which
+            done = walletStore.applied_operations([wallets[uid].id for uid in op_ids], op_ids.values())
+            applied = {uid for uid, op_id in op_ids.items() if op_id in done}
+
+    # Wallets still in the list layout are converted item by item
+    for uid in legacy:
+        for index, item, to_amount, _ in accepted[uid]:
+            if walletStore.transfer(wallets[uid], item["fromCurrency"], item["amount"], item["toCurrency"], to_amount):
+                applied.add((uid, index))
+            else:
+                results[index] = {"index": index, "success": False, "message": f"Insufficient balance in {item['fromCurrency']}"}
+
+    transactions, logged = [], []
+    now = datetime.now()
+    for uid, wallet_items in accepted.items():
+        invalidate_wallet(uid)
+        for index, item, to_amount, exchange_rate in wallet_items:
+            if uid not in applied and (uid, index) not in applied:
+                if results[index]["success"]:
+                    results[index] = {"index": index, "success": False, "message": "Wallet balance changed during the batch, please try again"}
+                continue
+            message = f"{item['amount']} {item['fromCurrency']} converted to {round(to_amount, 2)} {item['toCurrency']} in user's wallet"
+            transactions.append({
+                "uid": uid,
+                "fromCurrency": item["fromCurrency"],
+                "toCurrency": item["toCurrency"],
+                "fromAmount": item["amount"],
+                "toAmount": round(to_amount, 2),
+                "exchangeRate": exchange_rate,
+                "delivery": None,
+                "toDigital": item["toDigital"],
+                "message": message,
+                "status": "success",
+                "createdat": now,
+                "type": "homeDelivery",
+                "delivered": False,
+                "confirmed": True
+            })
+            logged.append(index)
+            results[index]["message"] = message
+
+    if transactions:
+        inserted = insert_transactions(transactions)
+        for index, transaction_id in zip(logged, inserted.inserted_ids):
+            results[index]["transactionId"] = str(transaction_id)
+        record_conversions(transactions)
+
+CONVERSION_SUMMARY_MONTHS = int(os.getenv("CONVERSION_SUMMARY_MONTHS", "12"))
+
+def conversionSummary(uid, months=None):
+    # Served from the user's rollup document instead of scanning the history
+    try:
+        try:
+            months = int(months) if months else CONVERSION_SUMMARY_MONTHS
+        except ValueError:
+            return {"message": "months must be a number"}, 400
+        if not uid:
+            return {"message": "Missing uid"}, 400
+        if not ObjectId.is_valid(uid):
+            return {"message": "Invalid uid"}, 400
+
+        rollup = find_conversion_summary(uid)
+        monthly = sorted(rollup.get("months", {}).items(), reverse=True)[:max(months, 0)]
+        return {
+            "data": {
+                "uid": uid,
+                "count": rollup.get("count", 0),
+                "lastActivity": rollup.get("lastActivity"),
+                "currencies": rollup.get("currencies", {}),
+                "months": [{"month": month, "currencies": currencies} for month, currencies in monthly],
+            },
+            "success": True
+        }, 200
+
+    except Exception as e:
+        print(e)
+        return {"error": str(e), "success": False}, 500
+
 def getWallet(uid):
     try:
-        wallet = walletCollection.find_one({'uid': uid})
+        wallet = find_wallet(uid)
         if not wallet:
             return {"message": "Wallet not found"}, 404
         
-        return {"data": wallet["balance"],"success":True}, 200
+        return {"data": wallet_balance_list(wallet),"success":True}, 200
     
     except Exception as e:
         print(e)
         return {"error": str(e),"success":False}, 500
 
 
+class ReturnMoneyError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def convert_amounts(amounts, to_currency):
+    # {currency: amount} -> ({currency: converted}, total) using one rate table;
+    # currencies outside the table fall back to a per-pair rate
+    rate_table = get_rate_table()
+    in_table = {c: a for c, a in amounts.items() if rate_table.has(c)} if rate_table.has(to_currency) else {}
+    converted, total = rate_table.convert_many(in_table, to_currency) if in_table else ({}, 0.0)
+    for currency, amount in amounts.items():
+        if currency not in in_table:
+            value = amount * get_exchange_rate(currency, to_currency)
+            converted[currency] = value
+            total += value
+    return converted, total
+
 def returnMoney(request):
+    # Converts wallet balances to INR and credits them to a home bank. "currency"
+    # converts one balance; "currencies" sweeps a list of them, or "all". The
+    # wallet update and the bank credit run in one transaction.
     try:
         user_data = request.json
         if not user_data:
@@ -502,68 +1040,76 @@ def returnMoney(request):
         uid = user_data.get("uid")
         bank_name = user_data.get("bankName")
         currency = user_data.get("currency")
+        currencies = user_data.get("currencies")
 
-        if not uid or not bank_name or not currency:
+        if not uid or not bank_name or not (currency or currencies):
             return {"message": "User ID, bank name, and currency are required"}, 400
+        if currencies is not None and currencies != "all" and (not isinstance(currencies, list) or not all(isinstance(c, str) for c in currencies)):
+            return {"message": "currencies must be a list of currency codes or \"all\""}, 400
 
         # Convert the UID to ObjectId and find the user
         object_id = ObjectId(uid)
-        user = userCollection.find_one({'_id': object_id})
+        user = find_user_profile(object_id)
         if not user:
             return {"message": "User not found"}, 404
 
-        # Find the user's wallet
-        wallet = walletCollection.find_one({'uid': str(user['_id'])})
-        if not wallet:
-            return {"message": "Wallet not found"}, 404
-
-        total_inr_amount = 0
-
-        # Loop through each currency in the wallet and convert to INR if it matches the specified currency
-        for balance_entry in wallet.get('balance', []):
-            if balance_entry['currency'].upper() == currency.upper():
-                amount = balance_entry['amount']
-
-                # Fetch the exchange rate for conversion to INR (assume this function exists)
-                exchange_rate = get_exchange_rate(currency, "INR")
-                inr_amount = amount * exchange_rate
-
-                # Add the converted INR amount to the total
-                total_inr_amount += inr_amount
-
-                # Set the converted currency's balance to zero in the wallet after conversion
-                balance_entry['amount'] = 0
-
-                break
-
-        if total_inr_amount <= 0:
-            return {"message": f"No convertible balance available for {currency}"}, 400
-
         # Find the user's bank account from homeBank using bank_name
-        home_bank_accounts = user.get('homeBank', [])
-        selected_bank = next((bank for bank in home_bank_accounts if bank['bankName'].lower() == bank_name.lower()), None)
-
+        selected_bank = next((bank for bank in user.homeBank if bank['bankName'].lower() == bank_name.lower()), None)
         if not selected_bank:
             return {"message": f"Bank '{bank_name}' not found in user's home banks"}, 404
 
-        # Update the bank balance with the converted amount
-        selected_bank['balance'] += total_inr_amount
-
-        # Update the user's bank information in the database
-        userCollection.update_one(
-            {'_id': object_id},
-            {'$set': {'homeBank': home_bank_accounts}}
-        )
-
-        # Update the user's wallet balance in the database
-        walletCollection.update_one(
-            {'_id': wallet['_id']},
-            {'$set': {'balance': wallet['balance']}}
-        )
+        # Read the wallet uncached: every amount read becomes an equality guard below
+        wallet = walletStore.find(str(user.id))
+        if not wallet:
+            return {"message": "Wallet not found"}, 404
 
+        if currencies == "all":
+            selected = list(wallet.balances)
+        elif currencies is not None:
+            selected = list(dict.fromkeys(c.upper() for c in currencies))
+        else:
+            selected = [currency.upper()]
+        amounts = {c: wallet.balances[c] for c in selected if wallet.balances.get(c, 0) > 0}
+        skipped = [c for c in selected if c not in amounts]
+        if not amounts:
+            return {"message": f"No convertible balance available for {currency or ', '.join(selected) or 'any currency'}"}, 400
+
+        converted, total_inr_amount = convert_amounts(amounts, "INR")
+
+        def sweep(session):
+            # Zero each converted balance only if it still holds the amount that was
+            # converted, so a concurrent transfer on the same wallet is never overwritten
+            if not walletStore.take_many(wallet, amounts, session=session):
+                raise ReturnMoneyError(f"{', '.join(amounts)} balance changed during conversion, please try again", 409)
+            try:
+                credited = credit_home_bank(object_id, selected_bank['bankName'], total_inr_amount, session=session)
+            except Exception:
+                # Without a transaction nothing rolls the wallet back, so whatever
+                # failed (including a database error) the balances are restored
+                if session is None:
+                    walletStore.credit_many(wallet, amounts)
+                raise
+            if not credited:
+                if session is None:
+                    walletStore.credit_many(wallet, amounts)
+                raise ReturnMoneyError(f"Bank '{bank_name}' not found in user's home banks", 404)
+
+        try:
+            run_transaction(sweep)
+        except ReturnMoneyError as e:
+            return {"message": e.message, "success": False}, e.status_code
+        finally:
+            invalidate_wallet(wallet.uid)
+            invalidate_user(object_id)
+
+        swept = ", ".join(amounts)
         return {
-            "message": f"{currency} balance converted to INR and added to {bank_name}. Total INR added: {round(total_inr_amount, 2)}",
+            "message": f"{swept} balance converted to INR and added to {bank_name}. Total INR added: {round(total_inr_amount, 2)}",
             "convertedAmount": round(total_inr_amount, 2),
+            "data": {
+                "converted": {c: {"amount": amounts[c], "inr": round(converted[c], 2)} for c in amounts},
+                "skipped": skipped
+            },
             "success": True
         }, 200
 
@@ -572,13 +1118,24 @@ def returnMoney(request):
         return {"message": "An error occurred while processing the transaction", "error": str(e)}, 500
 
 
+def fetch_kyc_code():
+    response = httpClient.get("kyc", JASWANTH_BACKEND_URL + "/api/generate_code")
+    if response.status_code != 200:
+        print(f"KYC code generation returned {response.status_code}")
+        return None
+    return response.json()['verification_code']
+
+kycCodes = CodePool("kyc", fetch_kyc_code, low_water=KYC_CODE_POOL_LOW, high_water=KYC_CODE_POOL_HIGH, ttl=KYC_CODE_TTL)
+registry.register_collector(kycCodes.metrics)
+
 def doKYC(request):
     try:
-        URL =  JASWANTH_BACKEND_URL + "/api/generate_code"
-        response = requests.get(URL)
-        if response.status_code!= 200:
+        # Fetch synchronously only when the pool is empty (or disabled)
+        code = kycCodes.take() if KYC_CODE_POOL else None
+        if code is None:
+            code = fetch_kyc_code()
+        if code is None:
             return {"message": "Failed to generate KYC code"}, 500
-        code = response.json()['verification_code']
         return {
             "success": True,
             "data":{
@@ -586,32 +1143,102 @@ def doKYC(request):
             }
         }, 200
 
+    except CircuitOpenError as e:
+        print(f"Error: {e}")
+        return {"message": "KYC code generation is temporarily unavailable, please try again later", "error": str(e)}, 503
     except Exception as e:
         print(f"Error: {e}")
         return {"message": "An error occurred while updating KYC status", "error": str(e)}, 500
 
 
 
-def transactionHistory(uid):
-    try:
-        # Fetch transactions for the given user ID
-        transactions = moneyWithdrawlTransactionsCollection.find({'uid': uid})
+TRANSACTION_PAGE_SIZE = int(os.getenv("TRANSACTION_PAGE_SIZE", "50"))
+TRANSACTION_MAX_PAGE_SIZE = int(os.getenv("TRANSACTION_MAX_PAGE_SIZE", "500"))
+TRANSACTION_FIELDS = ("uid", "fromCurrency", "toCurrency", "fromAmount", "toAmount", "exchangeRate", "delivery", "toDigital", "message", "status", "createdat", "type", "delivered", "confirmed")
+# Newest first; _id breaks ties between transactions logged in the same millisecond
+TRANSACTION_SORT = [('createdat', -1), ('_id', -1)]
+
+
+def encode_history_cursor(transaction):
+    position = json.dumps({"t": transaction['createdat'].isoformat(), "i": str(transaction['_id'])})
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
 
-        # Convert cursor to a list
-        transactions_list = list(transactions)
+def decode_history_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return datetime.fromisoformat(position["t"]), ObjectId(position["i"])
+
+def transaction_projection(fields):
+    # Keyset pagination needs createdat and _id in every document
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in TRANSACTION_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    projection = {f: 1 for f in requested}
+    projection['createdat'] = 1
+    return projection
+
+def transactionHistory(uid, limit=None, cursor=None, fields=None):
+    try:
+        try:
+            limit = min(int(limit), TRANSACTION_MAX_PAGE_SIZE) if limit else TRANSACTION_PAGE_SIZE
+            projection = transaction_projection(fields)
+            query = {'uid': uid}
+            if cursor:
+                createdat, last_id = decode_history_cursor(cursor)
+                query['$or'] = [
+                    {'createdat': {'$lt': createdat}},
+                    {'createdat': createdat, '_id': {'$lt': last_id}},
+                ]
+        except Exception as e:
+            return {"message": f"Invalid pagination parameters: {e}"}, 400
+        if limit <= 0:
+            return {"message": "limit must be greater than 0"}, 400
+
+        # Fetch one extra document to know whether another page exists
+        transactions_list = list(find_transactions(query, projection, sort=TRANSACTION_SORT, limit=limit + 1))
 
         # Check if there are no transactions
-        if not transactions_list:
+        if not transactions_list and not cursor:
             return {"message": "No transactions found"}, 404
-        
-        # Convert ObjectId fields to string
-        for transaction in transactions_list:
-            transaction['_id'] = str(transaction['_id'])  # Convert ObjectId to string
-            # If there are other ObjectId fields, convert them as well
-            # transaction['some_other_id'] = str(transaction['some_other_id'])
 
-        return {"data": transactions_list, "success": True}, 200
+        next_cursor = None
+        if len(transactions_list) > limit:
+            transactions_list = transactions_list[:limit]
+            next_cursor = encode_history_cursor(transactions_list[-1])
+
+        return {"data": transactions_list, "nextCursor": next_cursor, "success": True}, 200
     
     except Exception as e:
         print(e)
-        return {"error": str(e), "success": False}, 500
\ No newline at end of file
+        return {"error": str(e), "success": False}, 500
+
+def streamTransactionHistory(uid, fields=None):
+    # Bad fields, and a query that fails outright, raise here, before the
+    # streamed response starts: pulling the first document runs the query now
+    # (the cursor is lazy otherwise). A failure later in the stream cannot change
+    # the 200 any more, so it ends the body with an {"error": ..., "success": false}
+    # line that tells a cut-off export from a complete one.
+    projection = transaction_projection(fields)
+    transactions = find_transactions({'uid': uid}, projection, sort=TRANSACTION_SORT, batch_size=500)
+    try:
+        first = next(transactions, None)
+    except Exception:
+        transactions.close()
+        raise
+
+    def generate():
+        try:
+            if first is not None:
+                yield dumps_bytes(first) + b"\n"
+            for transaction in transactions:
+                yield dumps_bytes(transaction) + b"\n"
+        except Exception as e:
+            print(f"Transaction history stream for {uid} failed: {e}")
+            yield dumps_bytes({"error": str(e), "success": False}) + b"\n"
+        finally:
+            transactions.close()
+
+    return generate()
@@ -0,0 +1,34 @@
+import os #type: ignore
+from contollers.utils.Tokens import TokenSigner,TokenError,load_keys
+
+# Stateless session tokens issued at login. A valid token proves the user
+# existed when it was signed, so handlers can trust its uid and name without a
+# database round trip. Requests without a (valid) token keep the DB checks.
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 60 * 60)))
+sessionSigner = TokenSigner(*load_keys("SESSION_TOKEN_KEYS", "SESSION_TOKEN_ACTIVE_KEY"))
+
+
+def issue_session(uid, name):
+    return sessionSigner.sign({"typ": "session", "uid": uid, "name": name}, SESSION_TTL)
+
+
+def current_session(request):
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Bearer "):
+        return None
+    # The session is optional: any token that does not verify is ignored and
+    # the request falls back to the database checks
+    try:
+        session = sessionSigner.verify(header[len("Bearer "):].strip())
+    except TokenError as e:
+        print(f"Ignoring session token: {e}")
+        return None
+    if session.get("typ") != "session" or not isinstance(session.get("uid"), str):
+        return None
+    return session
+
+
+def session_user(request, uid):
+    # The session when it belongs to uid, otherwise None
+    session = current_session(request)
+    return session if session and session["uid"] == uid else None
@@ -0,0 +1,40 @@
+import threading #type: ignore
+from pymongo import monitoring #type: ignore
+from contollers.utils.Metrics import DB_SECONDS,DB_ERRORS,add_request_timing
+
+# Commands whose first field is not a collection name
+NON_COLLECTION_COMMANDS = {"getMore": "collection", "killCursors": None}
+
+
+class CommandMetrics(monitoring.CommandListener):
+    # Records every MongoDB command, including cursor getMores and bulk writes,
+    # per collection and command. Registered on the MongoClient so it sees
+    # every collection without wrapping each one. Events fire on the calling
+    # thread, so the time is also added to the current request's breakdown.
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        field = NON_COLLECTION_COMMANDS.get(event.command_name, event.command_name)
+        collection = event.command.get(field) if field else None
+        if not isinstance(collection, str):
+            collection = "none"
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "none")
+        seconds = event.duration_micros / 1e6
+        DB_SECONDS.observe(seconds, collection, event.command_name)
+        if failed:
+            DB_ERRORS.inc(collection, event.command_name)
+        add_request_timing("mongo", seconds)
@@ -0,0 +1,109 @@
+from pymongo import MongoClient #type: ignore
+from dotenv import load_dotenv #type: ignore
+import os, threading #type: ignore
+from contollers.db.CommandMetrics import CommandMetrics
+
+# .env is still read at import because the other modules read their settings with os.getenv as they load
+load_dotenv()
+
+# Nothing here connects at import. The client is created on first use in each
+# process, so a forked worker never shares sockets or monitor threads with its
+# parent, and importing the handlers (tests, scripts) stays offline.
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+# Server types that accept multi-document transactions. A standalone mongod
+# rejects them ("Transaction numbers are only allowed on a replica set member
+# or mongos"), so callers check supports_transactions() first.
+TRANSACTION_SERVER_TYPES = {"RSPrimary", "Mongos", "LoadBalancer"}
+
+_lock = threading.Lock()
+_client = None
+_pid = None
+_transactions = None
+
+
+def get_client():
+    global _client, _pid
+    client = _client
+    if client is not None and _pid == os.getpid():
+        return client
+    with _lock:
+        if _client is None or _pid != os.getpid():
+            # A client inherited across fork is dropped, not closed: closing it
+            # would act on sockets the parent still owns
+            _client = MongoClient(
+                os.getenv("MONGO_URI"),
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                # Command timings feed /metrics and the Server-Timing header
+                event_listeners=[CommandMetrics()],
+            )
+            _pid = os.getpid()
+        return _client
+
+def get_database():
+    return get_client()[os.getenv("MONGO_DB")]
+
+def close_client():
+    # Closes this process's client; the next call to get_client() opens a new one
+    global _client, _pid
+    with _lock:
+        if _client is not None and _pid == os.getpid():
+            _client.close()
+        _client = None
+        _pid = None
+
+def ping(timeout_ms=1000):
+    return get_client().admin.command('ping', maxTimeMS=timeout_ms)
+
+def supports_transactions():
+    # Asked once per client: the ping selects a server, after which the
+    # topology tells whether it is a replica set primary or a mongos
+    global _transactions
+    client = get_client()
+    known = _transactions
+    if known is not None and known[0] is client:
+        return known[1]
+    client.admin.command('ping')
+    servers = client.topology_description.server_descriptions().values()
+    supported = any(server.server_type_name in TRANSACTION_SERVER_TYPES for server in servers)
+    _transactions = (client, supported)
+    return supported
+
+
+class LazyCollection:
+    # Stands in for a pymongo Collection until first use. The collection name is
+    # read from the environment then, and the handle is rebuilt after a fork.
+
+    def __init__(self, env_name, default=None):
+        self.env_name = env_name
+        self.default = default
+        self._collection = None
+        self._pid = None
+
+    def collection(self):
+        collection = self._collection
+        if collection is None or self._pid != os.getpid() or collection.database.client is not _client:
+            collection = get_database()[os.getenv(self.env_name, self.default)]
+            self._collection = collection
+            self._pid = os.getpid()
+        return collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection(), name)
+
+    def __repr__(self):
+        return f"LazyCollection({self.env_name})"
+
+
+userCollection = LazyCollection("MONGO_COLLECTION_USERS")
+walletCollection = LazyCollection("MONGO_COLLECTION_WALLETS")
+globalWalletCollection = LazyCollection("MONGO_COLLECTION_GLOBALWALLETS")
+moneyWithdrawlTransactionsCollection = LazyCollection("MONGO_COLLECTION_MONEYWITHDRAWLTRANSACTIONS")
+transactionRollupCollection = LazyCollection("MONGO_COLLECTION_TRANSACTIONROLLUPS", "transactionRollups")
+redeemedQuoteCollection = LazyCollection("MONGO_COLLECTION_REDEEMEDQUOTES", "redeemedQuotes")
@@ -0,0 +1,87 @@
+from pymongo import ASCENDING, DESCENDING #type: ignore
+import threading #type: ignore
+from pymongo.errors import OperationFailure,PyMongoError #type: ignore
+
+# Indexes every hot-path query relies on, keyed by logical collection name
+INDEXES = {
+    "users": [
+        ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ],
+    "wallets": [
+        ([("uid", ASCENDING)], {"name": "uid_unique", "unique": True}),
+    ],
+    "transactions": [
+        ([("uid", ASCENDING), ("createdat", DESCENDING), ("_id", DESCENDING)], {"name": "uid_createdat_id"}),
+    ],
+    "globalWallet": [
+        ([("currency", ASCENDING), ("shard", ASCENDING)], {"name": "currency_shard_unique", "unique": True}),
+    ],
+    # Confirmed quote ids only need to outlive the quote itself
+    "redeemedQuotes": [
+        ([("expiresAt", ASCENDING)], {"name": "expiresAt_ttl", "expireAfterSeconds": 0}),
+    ],
+}
+
+
+def ensure_indexes(collections):
+    # create_index is a no-op when an identical index already exists, so this is
+    # safe to run on every startup. Failures (e.g. duplicate emails blocking a
+    # unique index) are reported instead of stopping the server. If MongoDB
+    # cannot be reached the remaining indexes are skipped rather than each
+    # waiting out its own server selection timeout.
+    created, failed = [], []
+    for name, specs in INDEXES.items():
+        collection = collections.get(name)
+        if collection is None:
+            continue
+        for keys, options in specs:
+            try:
+                collection.create_index(keys, **options)
+                created.append(f"{name}.{options['name']}")
+            except OperationFailure as e:
+                print(f"Could not create index {name}.{options['name']}: {e}")
+                failed.append({"collection": name, "index": options["name"], "error": str(e)})
+            except PyMongoError as e:
+                print(f"Could not create indexes, MongoDB unavailable: {e}")
+                failed.append({"collection": name, "index": options["name"], "error": str(e), "unavailable": True})
+                return created, failed
+    return created, failed
+
+
+def start_background_indexes(collections, status):
+    # Runs ensure_indexes off the request path, recording the outcome in the
+    # `status` dict for the readiness check
+    def run():
+        try:
+            created, failed = ensure_indexes(collections)
+            # retry: MongoDB was unreachable, so running again later can still succeed
+            status.update(state="done", created=len(created), failed=failed, retry=any(f.get("unavailable") for f in failed))
+        except Exception as e:
+            print(f"Index creation failed: {e}")
+            status.update(state="error", error=str(e), retry=True)
+
+    status.clear()
+    status["state"] = "running"
+    thread = threading.Thread(target=run, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def index_report(collections):
+    # Expected indexes that are missing, plus existing indexes that have not
+    # served a single operation since the server last restarted.
+    report = {"missing": [], "unused": []}
+    for name, collection in collections.items():
+        existing = {index["name"]: index for index in collection.list_indexes()}
+        for keys, options in INDEXES.get(name, []):
+            if options["name"] not in existing and not any(list(index["key"].items()) == keys for index in existing.values()):
+                report["missing"].append({"collection": name, "index": options["name"], "keys": keys})
+
+        try:
+            stats = collection.aggregate([{"$indexStats": {}}])
+            for stat in stats:
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0:
+                    report["unused"].append({"collection": name, "index": stat["name"], "since": stat["accesses"]["since"].isoformat()})
+        except OperationFailure as e:
+            print(f"Could not read index stats for {name}: {e}")
+    return report
@@ -0,0 +1,59 @@
+# Compact read models returned by contollers/db/Repository.py. Each one holds
+# only the fields its use case projects out of MongoDB.
+
+
+class UserProfile:
+    # Identity plus home banks: verifyUser, getBanks, addHomeBranch, homeDelivery, returnMoney
+    __slots__ = ("id", "name", "homeBank")
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self.name = doc.get('name')
+        self.homeBank = doc.get('homeBank', [])
+
+
+class UserName:
+    # verifyUser
+    __slots__ = ("id", "name")
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self.name = doc.get('name')
+
+
+class UserCredentials:
+    # loginUser
+    __slots__ = ("id", "name", "password")
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self.name = doc.get('name')
+        self.password = doc.get('password')
+
+
+class UserProofs:
+    # parseUserData
+    __slots__ = ("id", "addressProofPath", "idProofPath")
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self.addressProofPath = doc.get('addressProofPath')
+        self.idProofPath = doc.get('idProofPath')
+
+
+class Wallet:
+    # balances is always {currency: amount}; legacy marks a wallet still stored
+    # in the list layout (see WalletStore.py)
+    __slots__ = ("id", "uid", "balances", "legacy")
+
+    def __init__(self, doc):
+        self.id = doc['_id']
+        self.uid = doc.get('uid')
+        self.legacy = 'balances' not in doc and 'balance' in doc
+        if self.legacy:
+            balances = {}
+            for entry in doc['balance']:
+                balances[entry['currency']] = balances.get(entry['currency'], 0) + entry['amount']
+            self.balances = balances
+        else:
+            self.balances = dict(doc.get('balances', {}))
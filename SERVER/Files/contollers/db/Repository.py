@@ -0,0 +1,142 @@
+import os #type: ignore
+from pymongo.errors import DuplicateKeyError #type: ignore
+from contollers.db.Database import get_client,supports_transactions,userCollection,walletCollection,moneyWithdrawlTransactionsCollection,transactionRollupCollection,redeemedQuoteCollection
+from contollers.db.Models import UserProfile,UserName,UserCredentials,UserProofs,Wallet
+from contollers.db.WalletStore import WalletStore,WALLET_FIELDS
+from contollers.db.Rollups import TransactionRollups
+from contollers.utils.Cache import TTLCache
+
+# Per-use-case queries with explicit projections, so handlers only pull the
+# fields they read over the wire.
+USER_PROFILE_FIELDS = {'name': 1, 'homeBank': 1}
+USER_NAME_FIELDS = {'name': 1}
+USER_CREDENTIAL_FIELDS = {'name': 1, 'password': 1}
+USER_PROOF_FIELDS = {'addressProofPath': 1, 'idProofPath': 1}
+
+walletStore = WalletStore(walletCollection)
+transactionRollups = TransactionRollups(transactionRollupCollection, moneyWithdrawlTransactionsCollection)
+
+# Read-through caches for user profiles and wallets. Every write path invalidates
+# explicitly; the TTL bounds staleness across worker processes.
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "30"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+WALLET_CACHE_TTL = int(os.getenv("WALLET_CACHE_TTL", "10"))
+WALLET_CACHE_SIZE = int(os.getenv("WALLET_CACHE_SIZE", "10000"))
+userCache = TTLCache("user", ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE)
+walletCache = TTLCache("wallet", ttl=WALLET_CACHE_TTL, maxsize=WALLET_CACHE_SIZE)
+
+# Multi-document transactions need a replica set member or mongos. With
+# MONGO_TRANSACTIONS=auto (the default) the server is asked once per client and
+# a standalone mongod runs the same steps without one; true/false skip the check.
+MONGO_TRANSACTIONS = os.getenv("MONGO_TRANSACTIONS", "auto").lower()
+
+
+def run_transaction(callback):
+    # Runs callback(session) in a transaction, retried on transient errors.
+    # Without transactions the callback gets session=None and must undo its own
+    # partial writes on failure.
+    if MONGO_TRANSACTIONS == "false" or (MONGO_TRANSACTIONS != "true" and not supports_transactions()):
+        return callback(None)
+    with get_client().start_session() as session:
+        return session.with_transaction(callback)
+
+
+def load_user_profile(object_id):
+    doc = userCollection.find_one({'_id': object_id}, USER_PROFILE_FIELDS)
+    return UserProfile(doc) if doc else None
+
+def find_user_profile(object_id):
+    # Cached models are shared between requests and must not be mutated
+    return userCache.get_or_load(str(object_id), lambda: load_user_profile(object_id))
+
+def find_user_name(object_id):
+    # A profile already cached answers for free; otherwise only the name is
+    # read, never the homeBank array
+    profile = userCache.get(str(object_id))
+    if profile is not None:
+        return profile
+    doc = userCollection.find_one({'_id': object_id}, USER_NAME_FIELDS)
+    return UserName(doc) if doc else None
+
+def find_user_credentials(email):
+    doc = userCollection.find_one({'email': email}, USER_CREDENTIAL_FIELDS)
+    return UserCredentials(doc) if doc else None
+
+def find_user_proofs(object_id):
+    doc = userCollection.find_one({'_id': object_id}, USER_PROOF_FIELDS)
+    return UserProofs(doc) if doc else None
+
+def user_email_exists(email):
+    return userCollection.find_one({'email': email}, {'_id': 1}) is not None
+
+def insert_user(user):
+    return userCollection.insert_one(user)
+
+def push_home_bank(object_id, home_bank):
+    userCollection.update_one({'_id': object_id}, {'$push': {'homeBank': home_bank}})
+    userCache.invalidate(str(object_id))
+
+def credit_home_bank(object_id, bank_name, amount, session=None):
+    result = userCollection.update_one(
+        {'_id': object_id, 'homeBank.bankName': bank_name},
+        {'$inc': {'homeBank.$.balance': amount}},
+        session=session
+    )
+    userCache.invalidate(str(object_id))
+    return result.matched_count > 0
+
+def invalidate_user(object_id):
+    userCache.invalidate(str(object_id))
+
+def set_verified_address(object_id, address):
+    userCollection.update_one({'_id': object_id}, {'$set': {'address': address, "verified": True}})
+    userCache.invalidate(str(object_id))
+
+
+def find_existing_user_ids(object_ids):
+    return {doc['_id'] for doc in userCollection.find({'_id': {'$in': list(object_ids)}}, {'_id': 1})}
+
+def find_wallets(uids):
+    # Uncached bulk read: batch writes must start from current balances
+    return {wallet.uid: wallet for wallet in map(Wallet, walletCollection.find({'uid': {'$in': list(uids)}}, WALLET_FIELDS))}
+
+def find_wallet(uid):
+    return walletCache.get_or_load(uid, lambda: walletStore.find(uid))
+
+def invalidate_wallet(uid):
+    walletCache.invalidate(uid)
+
+
+def insert_transaction(transaction):
+    return moneyWithdrawlTransactionsCollection.insert_one(transaction)
+
+def insert_transactions(transactions):
+    return moneyWithdrawlTransactionsCollection.insert_many(transactions, ordered=False)
+
+def record_conversions(transactions):
+    # Transactions must already carry their uid, amounts and createdat
+    transactionRollups.record(transactions)
+
+def find_conversion_summary(uid):
+    return transactionRollups.summary(uid)
+
+def claim_quote(quote_id, uid, expires_at):
+    # Records a quote as confirmed. The unique _id makes this succeed once across
+    # every worker process; a TTL index removes the entry once the quote expired.
+    try:
+        redeemedQuoteCollection.insert_one({'_id': quote_id, 'uid': uid, 'expiresAt': expires_at})
+        return True
+    except DuplicateKeyError:
+        return False
+
+def release_quote(quote_id):
+    # Undoes claim_quote for a confirm that did not go through
+    redeemedQuoteCollection.delete_one({'_id': quote_id})
+
+def find_transactions(query, projection=None, sort=None, limit=0, batch_size=0):
+    cursor = moneyWithdrawlTransactionsCollection.find(query, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
@@ -0,0 +1,176 @@
+'''
+    Per-user conversion rollups, one document per user:
+
+        {"_id": uid, "complete": True, "count": 42, "lastActivity": ...,
+         "currencies": {"USD": {"fromAmount": 1200.0, "fromCount": 30,
+                                "toAmount": 85.5, "toCount": 4, "lastActivity": ...}},
+         "months": {"2024-03": {"USD": {"fromAmount": ..., "fromCount": ...,
+                                        "toAmount": ..., "toCount": ...}}}}
+
+    homeDelivery updates the rollup with one $inc/$max upsert per logged
+    conversion, so a summary is a single find_one. "complete" is set only by
+    rebuild(), which recomputes a user's rollup from the transaction log with
+    an aggregation pipeline. A rollup first created by an incremental update
+    holds only the conversions logged since, and is rebuilt on its first read.
+    A user without conversions gets an empty summary and no document.
+
+    rebuild() replaces the document with a compare-and-set on the "count" it
+    read before aggregating, so an incremental update that lands in between
+    makes it retry rather than be lost. (A conversion logged but not yet added
+    to its rollup while rebuild() aggregates is counted twice; that window is
+    the gap between the two writes in one request.) The backfill runs rebuild()
+    for every user with history:
+
+        python -m contollers.db.Rollups --pause 0.01
+'''
+import argparse, time #type: ignore
+from pymongo import UpdateOne #type: ignore
+from pymongo.errors import DuplicateKeyError #type: ignore
+from contollers.db.WalletStore import check_currency
+
+CONVERSIONS = {'type': 'homeDelivery', 'status': 'success'}
+REBUILD_ATTEMPTS = 5
+
+
+def month_of(when):
+    return when.strftime("%Y-%m")
+
+
+class TransactionRollups:
+
+    def __init__(self, collection, transactions):
+        self.collection = collection
+        self.transactions = transactions
+
+    def update_for(self, transaction):
+        # The UpdateOne that adds one logged conversion to its user's rollup
+        from_currency = check_currency(transaction['fromCurrency'])
+        to_currency = check_currency(transaction['toCurrency'])
+        when = transaction['createdat']
+        month = month_of(when)
+        inc = {
+            'count': 1,
+            f'currencies.{from_currency}.fromAmount': transaction['fromAmount'],
+            f'currencies.{from_currency}.fromCount': 1,
+            f'currencies.{to_currency}.toAmount': transaction['toAmount'],
+            f'currencies.{to_currency}.toCount': 1,
+            f'months.{month}.{from_currency}.fromAmount': transaction['fromAmount'],
+            f'months.{month}.{from_currency}.fromCount': 1,
+            f'months.{month}.{to_currency}.toAmount': transaction['toAmount'],
+            f'months.{month}.{to_currency}.toCount': 1,
+        }
+        latest = {
+            'lastActivity': when,
+            f'currencies.{from_currency}.lastActivity': when,
+            f'currencies.{to_currency}.lastActivity': when,
+        }
+        return UpdateOne({'_id': transaction['uid']}, {'$inc': inc, '$max': latest, '$setOnInsert': {'complete': False}}, upsert=True)
+
+    def record(self, transactions):
+        # Best effort: the conversions are already committed, so a failed update
+        # leaves the rollup marked incomplete and it is rebuilt on its next read
+        operations, uids = [], set()
+        for transaction in transactions:
+            try:
+                operations.append(self.update_for(transaction))
+                uids.add(transaction['uid'])
+            except Exception as e:
+                print(f"Rollup skipped for transaction {transaction.get('_id')}: {e}")
+        if not operations:
+            return
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"Rollup update failed for {len(uids)} user(s): {e}")
+            try:
+                self.collection.update_many({'_id': {'$in': list(uids)}}, {'$set': {'complete': False}})
+            except Exception as e:
+                print(f"Could not mark rollups incomplete: {e}")
+
+    def pipeline(self, uid):
+        # One row per (month, currency, side) of a user's conversions
+        return [
+            {'$match': dict(CONVERSIONS, uid=uid)},
+            {'$project': {
+                'createdat': 1,
+                'month': {'$dateToString': {'format': '%Y-%m', 'date': '$createdat'}},
+                'sides': [
+                    {'currency': '$fromCurrency', 'side': 'from', 'amount': '$fromAmount'},
+                    {'currency': '$toCurrency', 'side': 'to', 'amount': '$toAmount'},
+                ],
+            }},
+            {'$unwind': '$sides'},
+            {'$group': {
+                '_id': {'month': '$month', 'currency': '$sides.currency', 'side': '$sides.side'},
+                'amount': {'$sum': '$sides.amount'},
+                'count': {'$sum': 1},
+                'lastActivity': {'$max': '$createdat'},
+            }},
+        ]
+
+    def compute(self, uid):
+        rollup = {'_id': uid, 'complete': True, 'count': 0, 'lastActivity': None, 'currencies': {}, 'months': {}}
+        for row in self.transactions.aggregate(self.pipeline(uid)):
+            key, side = row['_id'], row['_id']['side']
+            totals = rollup['currencies'].setdefault(key['currency'], {'fromAmount': 0, 'fromCount': 0, 'toAmount': 0, 'toCount': 0, 'lastActivity': None})
+            monthly = rollup['months'].setdefault(key['month'], {}).setdefault(key['currency'], {'fromAmount': 0, 'fromCount': 0, 'toAmount': 0, 'toCount': 0})
+            for bucket in (totals, monthly):
+                bucket[f'{side}Amount'] += row['amount']
+                bucket[f'{side}Count'] += row['count']
+            if totals['lastActivity'] is None or row['lastActivity'] > totals['lastActivity']:
+                totals['lastActivity'] = row['lastActivity']
+            if rollup['lastActivity'] is None or row['lastActivity'] > rollup['lastActivity']:
+                rollup['lastActivity'] = row['lastActivity']
+            # Every conversion has exactly one "from" side
+            if side == 'from':
+                rollup['count'] += row['count']
+        return rollup
+
+    def rebuild(self, uid):
+        for _ in range(REBUILD_ATTEMPTS):
+            current = self.collection.find_one({'_id': uid}, {'count': 1})
+            rollup = self.compute(uid)
+            try:
+                if current is None:
+                    # Nothing to store for a user without conversions; the next
+                    # logged conversion creates the document
+                    if not rollup['count']:
+                        return rollup
+                    self.collection.insert_one(rollup)
+                    return rollup
+                if self.collection.replace_one({'_id': uid, 'count': current.get('count', 0)}, rollup).matched_count:
+                    return rollup
+            except DuplicateKeyError:
+                pass
+            # A conversion was recorded while aggregating; start over
+        raise RuntimeError(f"Rollup for {uid} kept changing during rebuild")
+
+    def summary(self, uid):
+        rollup = self.collection.find_one({'_id': uid})
+        if rollup is None or not rollup.get('complete'):
+            rollup = self.rebuild(uid)
+        return rollup
+
+    def backfill(self, pause=0.0):
+        # Users come from the transaction log, so users without conversions are skipped
+        rebuilt = failed = 0
+        for row in self.transactions.aggregate([{'$match': CONVERSIONS}, {'$group': {'_id': '$uid'}}], allowDiskUse=True):
+            try:
+                self.rebuild(row['_id'])
+                rebuilt += 1
+            except Exception as e:
+                print(f"Rollup backfill failed for {row['_id']}: {e}")
+                failed += 1
+            if pause:
+                time.sleep(pause)
+        return rebuilt, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build conversion rollups from the transaction history")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between users")
+    args = parser.parse_args()
+
+    from contollers.db.Repository import transactionRollups #type: ignore
+    rebuilt, failed = transactionRollups.backfill(args.pause)
+    print(f"Rebuilt {rebuilt} rollup(s), {failed} failed")
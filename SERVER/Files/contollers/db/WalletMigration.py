@@ -0,0 +1,73 @@
+'''
+    Batched online migration of wallets from the list layout
+    ({"balance": [{amount, currency}, ...]}) to the currency-keyed layout
+    ({"balances": {currency: amount}}) described in WalletStore.py.
+
+    Each wallet is rewritten with a compare-and-set on its original balance
+    list, so a transfer that lands between the read and the write is never
+    lost: that wallet simply no longer matches and is picked up again by the
+    next batch. Handlers keep working on both layouts while this runs.
+
+        python -m contollers.db.WalletMigration --batch 500 --pause 0.05
+'''
+import argparse, threading, time #type: ignore
+from pymongo import UpdateOne #type: ignore
+
+LEGACY_WALLETS = {'balance': {'$exists': True}, 'balances': {'$exists': False}}
+
+
+def migrate_batch(collection, batch_size=500):
+    wallets = list(collection.find(LEGACY_WALLETS, {'balance': 1}).limit(batch_size))
+    if not wallets:
+        return 0, 0
+
+    operations = []
+    for wallet in wallets:
+        balances = {}
+        for entry in wallet['balance']:
+            balances[entry['currency']] = balances.get(entry['currency'], 0) + entry['amount']
+        operations.append(UpdateOne(
+            {'_id': wallet['_id'], 'balance': wallet['balance']},
+            {'$set': {'balances': balances}, '$unset': {'balance': ""}}
+        ))
+    result = collection.bulk_write(operations, ordered=False)
+    return len(wallets), result.modified_count
+
+
+def migrate_wallets(collection, batch_size=500, pause=0.05, max_batches=None):
+    # pause between batches keeps the migration from crowding out live traffic
+    scanned = migrated = batches = 0
+    while max_batches is None or batches < max_batches:
+        found, changed = migrate_batch(collection, batch_size)
+        if not found:
+            break
+        scanned += found
+        migrated += changed
+        batches += 1
+        print(f"Wallet migration: batch {batches}, {changed}/{found} wallets migrated")
+        if pause:
+            time.sleep(pause)
+    remaining = collection.count_documents(LEGACY_WALLETS)
+    return {"scanned": scanned, "migrated": migrated, "batches": batches, "remaining": remaining}
+
+
+def start_background_migration(collection, batch_size=500, pause=0.05):
+    def run():
+        try:
+            print(f"Wallet migration finished: {migrate_wallets(collection, batch_size, pause)}")
+        except Exception as e:
+            print(f"Wallet migration failed: {e}")
+
+    thread = threading.Thread(target=run, name="wallet-migration", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Migrate wallets to the currency-keyed layout")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.05)
+    args = parser.parse_args()
+
+    from contollers.db.Database import walletCollection #type: ignore
+    print(migrate_wallets(walletCollection, args.batch, args.pause))
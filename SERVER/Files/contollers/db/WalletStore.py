@@ -0,0 +1,134 @@
+import re #type: ignore
+from pymongo import UpdateOne #type: ignore
+from contollers.db.Models import Wallet
+
+# Wallets are stored keyed by currency code:
+#   {"uid": "...", "balances": {"INR": 2000, "USD": 400, ...}}
+# so one balance can be read, $inc-ed or projected directly. Wallets written
+# before that layout hold a list instead:
+#   {"uid": "...", "balance": [{"amount": 2000, "currency": "INR"}, ...]}
+# and are converted by contollers/db/WalletMigration.py. Until that finishes
+# every write here handles both layouts.
+
+CURRENCY_CODE = re.compile(r"^[A-Z]{3}$")
+# How many recent batch operation ids each wallet remembers (see batch_operation)
+BATCH_OPS_KEPT = 50
+WALLET_FIELDS = {'uid': 1, 'balances': 1, 'balance': 1}
+
+
+def check_currency(currency):
+    # Currency codes become field names, so only plain ISO-style codes are allowed
+    if not isinstance(currency, str) or not CURRENCY_CODE.match(currency):
+        raise ValueError(f"Invalid currency code: {currency}")
+    return currency
+
+
+def wallet_balance_list(wallet):
+    # The response shape getWallet has always returned
+    return [{"amount": amount, "currency": currency} for currency, amount in wallet.balances.items()]
+
+
+class WalletStore:
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def create(self, uid, balances):
+        return self.collection.insert_one({"uid": uid, "balances": dict(balances)})
+
+    def find(self, uid):
+        doc = self.collection.find_one({'uid': uid}, WALLET_FIELDS)
+        return Wallet(doc) if doc else None
+
+    def transfer(self, wallet, from_currency, amount, to_currency, to_amount):
+        # Debit and credit in one conditional update that only applies while
+        # fromCurrency still covers the amount.
+        return self._apply(wallet, {from_currency: -amount, to_currency: to_amount}, [(from_currency, '$gte', amount)])
+
+    def debit(self, wallet, currency, amount):
+        return self._apply(wallet, {currency: -amount}, [(currency, '$gte', amount)])
+
+    def credit(self, wallet, currency, amount):
+        return self._apply(wallet, {currency: amount})
+
+    def credit_many(self, wallet, amounts, session=None):
+        return self._apply(wallet, amounts, session=session)
+
+    def take(self, wallet, currency, expected):
+        # Remove `expected` only if the balance still equals it, so a concurrent
+        # transfer between read and write is never overwritten.
+        return self._apply(wallet, {currency: -expected}, [(currency, '$eq', expected)])
+
+    def take_many(self, wallet, expected, session=None):
+        # take() for several currencies in one update: applies only while every
+        # balance in {currency: amount} still equals the amount read
+        return self._apply(wallet, {c: -a for c, a in expected.items()}, [(c, '$eq', a) for c, a in expected.items()], session)
+
+    def batch_operation(self, wallet, deltas, op_id):
+        # UpdateOne for bulk_write applying net {currency: delta} changes to a
+        # keyed-layout wallet, guarded so no balance goes negative. bulk_write
+        # only reports totals, so the op id is recorded on the wallet to tell
+        # afterwards which operations matched (see applied_operations).
+        query = {'_id': wallet.id, 'balances': {'$exists': True}}
+        for currency, delta in deltas.items():
+            check_currency(currency)
+            if delta < 0:
+                query[f'balances.{currency}'] = {'$gte': -delta}
+        update = {
+            '$inc': {f'balances.{c}': d for c, d in deltas.items()},
+            '$push': {'batchOps': {'$each': [op_id], '$slice': -BATCH_OPS_KEPT}},
+        }
+        return UpdateOne(query, update)
+
+    def bulk_write(self, operations):
+        return self.collection.bulk_write(operations, ordered=False)
+
+    def applied_operations(self, wallet_ids, op_ids):
+        applied = set()
+        for doc in self.collection.find({'_id': {'$in': list(wallet_ids)}, 'batchOps': {'$in': list(op_ids)}}, {'batchOps': 1}):
+            applied.update(doc['batchOps'])
+        return applied & set(op_ids)
+
+    def _apply(self, wallet, changes, guards=(), session=None):
+        # guards: [(currency, operator, value)] that must all hold for the update to apply
+        deltas = {}
+        for currency, delta in changes.items():
+            check_currency(currency)
+            deltas[currency] = deltas.get(currency, 0) + delta
+
+        # Migration only ever moves wallets from the list layout to the keyed one,
+        # so a legacy read may need to retry against the keyed layout but never
+        # the other way round.
+        attempts = (self._apply_legacy, self._apply_keyed) if wallet.legacy else (self._apply_keyed,)
+        for attempt in attempts:
+            if attempt(wallet, deltas, guards, session):
+                return True
+        return False
+
+    def _apply_keyed(self, wallet, deltas, guards, session):
+        query = {'_id': wallet.id, 'balances': {'$exists': True}}
+        for currency, op, value in guards:
+            query[f'balances.{currency}'] = {op: value}
+        result = self.collection.update_one(query, {'$inc': {f'balances.{c}': d for c, d in deltas.items()}}, session=session)
+        return result.matched_count > 0
+
+    def _apply_legacy(self, wallet, deltas, guards, session):
+        query = {'_id': wallet.id, 'balance': {'$exists': True}}
+        if guards:
+            query['balance'] = {'$all': [{'$elemMatch': {'currency': c, 'amount': {op: value}}} for c, op, value in guards]}
+
+        # Array filters only reach existing entries, so add any missing currency first
+        for currency, delta in deltas.items():
+            if delta > 0 and currency not in wallet.balances:
+                self.collection.update_one(
+                    {'_id': wallet.id, 'balance': {'$exists': True}, 'balance.currency': {'$ne': currency}},
+                    {'$push': {'balance': {"currency": currency, "amount": 0}}},
+                    session=session
+                )
+
+        inc, filters = {}, []
+        for i, (currency, delta) in enumerate(deltas.items()):
+            inc[f'balance.$[c{i}].amount'] = delta
+            filters.append({f'c{i}.currency': currency})
+        result = self.collection.update_one(query, {'$inc': inc}, array_filters=filters, session=session)
+        return result.matched_count > 0
@@ -0,0 +1,240 @@
+import json, os, sqlite3, threading, time, uuid #type: ignore
+
+# Persistent local job queue backed by SQLite, shared by every worker process on
+# the host. Jobs move queued -> running -> succeeded | failed; jobs left running
+# by a process that died are put back in the queue after JOB_STALE_SECONDS.
+
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, status);
+'''
+
+ACTIVE = ("queued", "running")
+
+
+class JobQueue:
+
+    def __init__(self, path):
+        # The database file and schema are created on first use, not at import
+        self.path = path
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _initialize(self):
+        with self._lock:
+            if self._ready:
+                return
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = self._open()
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            self._ready = True
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _connect(self):
+        # A short-lived connection per operation keeps the queue safe to use from
+        # any thread and across forked worker processes.
+        if not self._ready:
+            self._initialize()
+        return self._open()
+
+    def enqueue(self, kind, payload, dedupe_key=None):
+        # Returns (job, created). With a dedupe_key, an already active job for the
+        # same key is returned instead of queueing a duplicate.
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                    (dedupe_key, *ACTIVE)
+                ).fetchone()
+                if row:
+                    conn.execute("COMMIT")
+                    return self._job(row), False
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, dedupe_key, payload, status, progress, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, kind, dedupe_key, json.dumps(payload), now, now)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(job_id), True
+
+    def claim(self, kinds):
+        now = time.time()
+        placeholders = ", ".join("?" for _ in kinds)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"UPDATE jobs SET status = 'queued', progress = 'requeued', updated_at = ? WHERE status = 'running' AND updated_at < ? AND kind IN ({placeholders})",
+                (now, now - JOB_STALE_SECONDS, *kinds)
+            )
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE status = 'queued' AND kind IN ({placeholders}) ORDER BY created_at LIMIT 1",
+                tuple(kinds)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', progress = 'started', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (now, row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"]) if row else None
+
+    def progress(self, job_id, progress):
+        self._update(job_id, progress=progress)
+
+    def complete(self, job_id, result):
+        self._update(job_id, status="succeeded", progress="done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._update(job_id, status="failed", progress="done", error=str(error))
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._job(row) if row else None
+
+    def depth(self):
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        finally:
+            conn.close()
+        return {row["status"]: row["n"] for row in rows}
+
+    def _job(self, row):
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": row["progress"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+        }
+
+
+class JobWorkers:
+    # Pool of threads that claim jobs of the given kinds and run their handler.
+    # concurrency bounds how many jobs (e.g. OCR uploads) run at the same time.
+
+    def __init__(self, queue, handlers, concurrency=4, poll_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        # Threads do not survive fork, so a forked worker process starts its own pool
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = []
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        # timeout bounds the whole shutdown, not each thread's join
+        self._stop.set()
+        self._wakeup.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def _run(self):
+        kinds = tuple(self.handlers)
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim(kinds)
+            except Exception as e:
+                print(f"Job queue error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            try:
+                result = self.handlers[job["kind"]](job, lambda progress: self.queue.progress(job["id"], progress))
+            except Exception as e:
+                print(f"Job {job['id']} failed: {e}")
+                self._record(self.queue.fail, job, e)
+                continue
+            # The handler's work is done; failing to record that must not mark the job failed
+            self._record(self.queue.complete, job, result)
+
+    def _record(self, mark, job, outcome, attempts=3):
+        # A queue error (e.g. sqlite "database is locked") must never end the worker
+        # thread. It is retried briefly, since a job left running is requeued once
+        # stale and would run its handler again.
+        for attempt in range(attempts):
+            try:
+                mark(job["id"], outcome)
+                return
+            except Exception as e:
+                print(f"Could not record the outcome of job {job['id']} (attempt {attempt + 1}): {e}")
+                if self._stop.wait(0.5 * (attempt + 1)):
+                    return
@@ -0,0 +1,146 @@
+import threading, time #type: ignore
+from collections import OrderedDict #type: ignore
+
+
+class TTLCache:
+    # Bounded in-process cache with per-entry TTL and LRU eviction.
+    # get_or_load() deduplicates concurrent misses for the same key: the first
+    # caller runs the loader, every other caller waits for and shares its result.
+
+    def __init__(self, name, ttl=60, maxsize=256):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_seconds = 0.0
+        self.last_load_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key, value, ttl=None):
+        # Stores value only if key has no live entry; returns whether it was stored
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return False
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key, loader):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+
+        if not leader:
+            return flight.wait()
+
+        started = time.perf_counter()
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.load_errors += 1
+            flight.fail(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.loads += 1
+                self.load_seconds += elapsed
+                self.last_load_seconds = elapsed
+
+        # Loaders return None for "not found"; those results are shared with
+        # waiters but never stored, so a later write is picked up immediately.
+        if value is not None:
+            self.set(key, value)
+        with self._lock:
+            self._inflight.pop(key, None)
+        flight.resolve(value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "loadErrors": self.load_errors,
+                "loadSeconds": round(self.load_seconds, 6),
+                "lastLoadSeconds": round(self.last_load_seconds, 6),
+            }
+
+
+class _Flight:
+    # A single in-progress load that followers block on.
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def resolve(self, value):
+        self._value = value
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,113 @@
+import os, threading, time #type: ignore
+from collections import deque #type: ignore
+from contollers.utils.Metrics import registry
+
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_SLOW_SECONDS = float(os.getenv("CIRCUIT_SLOW_SECONDS", "5"))
+CIRCUIT_SLOW_RATE = float(os.getenv("CIRCUIT_SLOW_RATE", "0.8"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_TRANSITIONS = registry.counter("circuit_transitions_total", "Circuit breaker state changes, by upstream.", ("upstream", "from_state", "to_state"))
+CIRCUIT_REJECTIONS = registry.counter("circuit_rejections_total", "Calls failed fast by an open circuit, by upstream.", ("upstream",))
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is unavailable (circuit open), retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    # Per-upstream breaker over the last `window` calls. It opens when, with at
+    # least `min_calls` recorded, the share of failed calls reaches
+    # `failure_rate` or the share of calls slower than `slow_seconds` reaches
+    # `slow_rate`. While open every call fails fast with CircuitOpenError. After
+    # `open_seconds` up to `half_open_calls` probes are let through: one success
+    # closes it again, one failure reopens it.
+
+    def __init__(self, name, window=CIRCUIT_WINDOW, min_calls=CIRCUIT_MIN_CALLS, failure_rate=CIRCUIT_FAILURE_RATE,
+                 slow_seconds=CIRCUIT_SLOW_SECONDS, slow_rate=CIRCUIT_SLOW_RATE, open_seconds=CIRCUIT_OPEN_SECONDS,
+                 half_open_calls=CIRCUIT_HALF_OPEN_CALLS):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self._calls = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.transitions = 0
+
+    def before_call(self):
+        # Raises CircuitOpenError instead of letting the call through
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.open_seconds - time.monotonic()
+                if remaining > 0:
+                    self._reject(remaining)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    self._reject(self.open_seconds)
+                self._probes += 1
+
+    def record(self, elapsed, failed):
+        slow = elapsed >= self.slow_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(self._probes - 1, 0)
+                self._transition(OPEN if failed or slow else CLOSED)
+                return
+            if self.state == OPEN:
+                # A call let through before the circuit opened
+                return
+            self._calls.append((failed, slow))
+            if len(self._calls) >= self.min_calls:
+                failures = sum(1 for f, _ in self._calls if f) / len(self._calls)
+                slow_calls = sum(1 for _, s in self._calls if s) / len(self._calls)
+                if failures >= self.failure_rate or slow_calls >= self.slow_rate:
+                    self._transition(OPEN)
+
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN and time.monotonic() < self._opened_at + self.open_seconds
+
+    def _reject(self, retry_after):
+        self.rejected += 1
+        CIRCUIT_REJECTIONS.inc(self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        print(f"Circuit {self.name}: {self.state} -> {state}")
+        CIRCUIT_TRANSITIONS.inc(self.name, self.state, state)
+        self.transitions += 1
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._probes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": len(self._calls),
+                "failures": sum(1 for f, _ in self._calls if f),
+                "slowCalls": sum(1 for _, s in self._calls if s),
+                "rejected": self.rejected,
+                "transitions": self.transitions,
+            }
@@ -0,0 +1,144 @@
+import os, threading, time #type: ignore
+from collections import deque #type: ignore
+from contollers.utils.Metrics import registry
+
+CODE_POOL_POLL_INTERVAL = float(os.getenv("CODE_POOL_POLL_INTERVAL", "5"))
+# Longest pause between refill attempts while the upstream keeps failing
+CODE_POOL_MAX_BACKOFF = float(os.getenv("CODE_POOL_MAX_BACKOFF", "60"))
+
+CODE_POOL_FETCH_SECONDS = registry.histogram("code_pool_fetch_seconds", "Time spent fetching one code to refill a pool, by pool and outcome.", ("pool", "outcome"))
+CODE_POOL_TAKES = registry.counter("code_pool_takes_total", "Codes requested from a pool, by pool and result (hit or miss).", ("pool", "result"))
+CODE_POOL_EVICTIONS = registry.counter("code_pool_evictions_total", "Pooled codes dropped unused after their ttl, by pool.", ("pool",))
+
+
+class CodePool:
+    # Pre-fetched single-use codes, refilled by a background thread. When the
+    # pool drops below `low_water` the thread fetches codes one by one until it
+    # holds `high_water`. Each code is handed out once, oldest first, and only
+    # within `ttl` seconds of being fetched; older codes are evicted unused.
+    # fetch() returns a code, or None (or raises) when the upstream failed.
+
+    def __init__(self, name, fetch, low_water=5, high_water=20, ttl=300, poll_interval=CODE_POOL_POLL_INTERVAL):
+        self.name = name
+        self.fetch = fetch
+        self.low_water = low_water
+        self.high_water = high_water
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._codes = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.fetch_seconds = 0.0
+        self.last_refill_seconds = 0.0
+
+    def start(self):
+        # Threads do not survive fork, and codes copied from the parent would be
+        # handed out twice, so a forked worker process starts with an empty pool
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            self._codes.clear()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"code-pool-{self.name}", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def take(self):
+        # A pooled code, or None when the pool is empty (the caller fetches one itself)
+        with self._lock:
+            self._evict(time.monotonic())
+            if self._codes:
+                code = self._codes.popleft()[1]
+                self.hits += 1
+            else:
+                code = None
+                self.misses += 1
+            depth = len(self._codes)
+        CODE_POOL_TAKES.inc(self.name, "hit" if code is not None else "miss")
+        if depth < self.low_water:
+            self._wakeup.set()
+        return code
+
+    def depth(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._codes)
+
+    def _evict(self, now):
+        while self._codes and self._codes[0][0] + self.ttl <= now:
+            self._codes.popleft()
+            self.evictions += 1
+            CODE_POOL_EVICTIONS.inc(self.name)
+
+    def _run(self):
+        backoff = self.poll_interval
+        while not self._stop.is_set():
+            if self.depth() < self.low_water:
+                backoff = self.poll_interval if self._refill() else min(backoff * 2, CODE_POOL_MAX_BACKOFF)
+                wait = backoff
+            else:
+                backoff = wait = self.poll_interval
+            # Woken early by take() when the pool runs low; otherwise the poll also
+            # catches codes that expired while the pool sat idle
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _refill(self):
+        # Fetch up to high_water; stops at the first failure and reports whether it completed
+        started = time.perf_counter()
+        try:
+            while not self._stop.is_set() and self.depth() < self.high_water:
+                fetch_started = time.perf_counter()
+                try:
+                    code = self.fetch()
+                except Exception as e:
+                    print(f"Code pool {self.name}: fetch failed: {e}")
+                    code = None
+                elapsed = time.perf_counter() - fetch_started
+                CODE_POOL_FETCH_SECONDS.observe(elapsed, self.name, "ok" if code is not None else "error")
+                with self._lock:
+                    self.fetches += 1
+                    self.fetch_seconds += elapsed
+                    if code is None:
+                        self.fetch_errors += 1
+                        return False
+                    self._codes.append((time.monotonic(), code))
+            return True
+        finally:
+            self.last_refill_seconds = time.perf_counter() - started
+
+    def metrics(self):
+        return [("code_pool_depth", "gauge", "Unexpired codes currently pooled, by pool.", [({"pool": self.name}, self.depth())])]
+
+    def stats(self):
+        depth = self.depth()
+        with self._lock:
+            return {
+                "name": self.name,
+                "depth": depth,
+                "lowWater": self.low_water,
+                "highWater": self.high_water,
+                "ttl": self.ttl,
+                "running": self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "fetches": self.fetches,
+                "fetchErrors": self.fetch_errors,
+                "avgFetchSeconds": round(self.fetch_seconds / self.fetches, 6) if self.fetches else 0.0,
+                "lastRefillSeconds": round(self.last_refill_seconds, 6),
+            }
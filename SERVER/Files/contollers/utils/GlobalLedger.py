@@ -0,0 +1,147 @@
+import random #type: ignore
+
+
+class GlobalWalletError(Exception):
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class GlobalLedger:
+    # The platform wallet split into N sub-ledger documents per currency:
+    #   {"currency": "USD", "shard": 3, "amount": 12500000000000}
+    # Writes land on one shard with a conditional $inc, so concurrent transfers
+    # no longer serialize on a single document. Balances are the sum over shards.
+
+    def __init__(self, collection, shards=8):
+        self.collection = collection
+        self.shards = shards
+
+    def _shard_filter(self, currency=None):
+        query = {'shard': {'$exists': True}}
+        if currency is not None:
+            query['currency'] = currency
+        return query
+
+    def bootstrap(self, initial_balances):
+        # Creates the shards once. A legacy single-document wallet
+        # ({"balance": [{amount, currency}, ...]}) is split into shards and removed.
+        if self.collection.count_documents(self._shard_filter(), limit=1) > 0:
+            return False
+
+        legacy = self.collection.find_one({'balance': {'$exists': True}})
+        if legacy:
+            initial_balances = [(b['currency'], b['amount']) for b in legacy['balance']]
+
+        docs = []
+        for currency, amount in initial_balances:
+            per_shard = amount / self.shards
+            for shard in range(self.shards):
+                docs.append({"currency": currency, "shard": shard, "amount": per_shard})
+        self.collection.insert_many(docs)
+        if legacy:
+            self.collection.delete_one({'_id': legacy['_id']})
+        return True
+
+    def balances(self):
+        pipeline = [
+            {'$match': self._shard_filter()},
+            {'$group': {'_id': '$currency', 'amount': {'$sum': '$amount'}, 'shards': {'$sum': 1}}},
+            {'$sort': {'_id': 1}},
+        ]
+        return [{"currency": row['_id'], "amount": row['amount'], "shards": row['shards']} for row in self.collection.aggregate(pipeline)]
+
+    def credit(self, currency, amount):
+        shard = random.randrange(self.shards)
+        result = self.collection.update_one({'currency': currency, 'shard': shard}, {'$inc': {'amount': amount}})
+        if result.matched_count == 0:
+            # Shard count changed since bootstrap: fall back to any shard of the currency
+            result = self.collection.update_one(self._shard_filter(currency), {'$inc': {'amount': amount}})
+            if result.matched_count == 0:
+                self._raise_missing(currency)
+        return shard
+
+    def debit(self, currency, amount):
+        if self._try_debit(currency, amount) is not None:
+            return True
+        # No single shard could cover the amount: move funds between shards and retry once
+        if self.rebalance(currency, amount):
+            if self._try_debit(currency, amount) is not None:
+                return True
+        if self.collection.count_documents(self._shard_filter(currency), limit=1) == 0:
+            self._raise_missing(currency)
+        raise GlobalWalletError(f"Insufficient balance in {currency} in global wallet", 400)
+
+    def transfer(self, credit_currency, credit_amount, debit_currency, debit_amount):
+        # Debit first since it is the side that can run short, then credit;
+        # a failed credit gives the debited amount back.
+        self.debit(debit_currency, debit_amount)
+        try:
+            self.credit(credit_currency, credit_amount)
+        except Exception:
+            self.credit(debit_currency, debit_amount)
+            raise
+
+    def _try_debit(self, currency, amount):
+        start = random.randrange(self.shards)
+        for offset in range(self.shards):
+            shard = (start + offset) % self.shards
+            result = self.collection.update_one(
+                {'currency': currency, 'shard': shard, 'amount': {'$gte': amount}},
+                {'$inc': {'amount': -amount}}
+            )
+            if result.modified_count:
+                return shard
+        return None
+
+    def _move(self, currency, from_shard, to_shard, amount):
+        result = self.collection.update_one(
+            {'currency': currency, 'shard': from_shard, 'amount': {'$gte': amount}},
+            {'$inc': {'amount': -amount}}
+        )
+        if result.modified_count == 0:
+            return False
+        self.collection.update_one({'currency': currency, 'shard': to_shard}, {'$inc': {'amount': amount}})
+        return True
+
+    def rebalance(self, currency, needed=0):
+        # Each move is a guarded debit on the donor followed by a credit on the
+        # receiver, so the currency total is preserved under concurrent writes.
+        shards = list(self.collection.find(self._shard_filter(currency), {'shard': 1, 'amount': 1}))
+        if not shards:
+            return False
+        total = sum(s['amount'] for s in shards)
+        if total < needed:
+            return False
+
+        shards.sort(key=lambda s: s['amount'], reverse=True)
+        target = total / len(shards)
+        if needed > target:
+            # Too large for an even split: consolidate into the richest shard
+            receiver = shards[0]
+            missing = needed - receiver['amount']
+            for donor in shards[1:]:
+                if missing <= 0:
+                    break
+                take = min(donor['amount'], missing)
+                if take > 0 and self._move(currency, donor['shard'], receiver['shard'], take):
+                    missing -= take
+            return missing <= 0
+
+        donors = [s for s in shards if s['amount'] > target]
+        for receiver in reversed(shards):
+            deficit = target - receiver['amount']
+            for donor in donors:
+                if deficit <= 0:
+                    break
+                take = min(donor['amount'] - target, deficit)
+                if take > 0 and self._move(currency, donor['shard'], receiver['shard'], take):
+                    donor['amount'] -= take
+                    deficit -= take
+        return True
+
+    def _raise_missing(self, currency):
+        if self.collection.count_documents(self._shard_filter(), limit=1) == 0:
+            raise GlobalWalletError("Global Wallet not found", 500)
+        raise GlobalWalletError(f"{currency} balance not found in global wallet", 500)
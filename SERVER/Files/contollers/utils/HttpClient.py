@@ -0,0 +1,144 @@
+import os, threading, time #type: ignore
+from urllib.parse import urlsplit #type: ignore
+import requests #type: ignore
+from requests.adapters import HTTPAdapter #type: ignore
+from urllib3.util.retry import Retry #type: ignore
+from contollers.utils.Metrics import registry,UPSTREAM_SECONDS,add_request_timing
+from contollers.utils.CircuitBreaker import CircuitBreaker,STATE_VALUES
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+
+
+class HttpClient:
+    # Shared outbound client: one keep-alive session (and connection pool) per
+    # host, default connect/read timeouts on every call, retries with
+    # exponential backoff, per-upstream latency counters and a circuit breaker
+    # per upstream (see CircuitBreaker.py). A 5xx response or an exception
+    # counts as a failed call.
+    #
+    # Retries only apply to idempotent methods; POSTs with file bodies are never
+    # replayed because their streams cannot be rewound safely.
+
+    def __init__(self, timeout=None, pool_size=HTTP_POOL_SIZE, retries=HTTP_RETRIES, backoff=HTTP_RETRY_BACKOFF):
+        self.timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff = backoff
+        self._sessions = {}
+        self._pid = os.getpid()
+        self._latency = {}
+        self._breakers = {}
+        self._breaker_settings = {}
+        self._lock = threading.Lock()
+
+    def _session(self, url):
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        if self._pid != os.getpid():
+            self.reset()
+        session = self._sessions.get(host)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                retry = Retry(
+                    total=self.retries,
+                    backoff_factor=self.backoff,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def configure_breaker(self, upstream, **settings):
+        # Overrides CircuitBreaker defaults for one upstream, e.g. a longer
+        # slow_seconds for OCR uploads; applies before the breaker's first use
+        with self._lock:
+            self._breaker_settings[upstream] = settings
+            self._breakers.pop(upstream, None)
+
+    def breaker(self, upstream):
+        breaker = self._breakers.get(upstream)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(upstream)
+                if breaker is None:
+                    breaker = self._breakers[upstream] = CircuitBreaker(upstream, **self._breaker_settings.get(upstream, {}))
+        return breaker
+
+    def request(self, upstream, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        breaker = self.breaker(upstream)
+        # Fails fast with CircuitOpenError while the upstream is known to be down
+        breaker.before_call()
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self._session(url).request(method, url, **kwargs)
+            outcome = f"{response.status_code // 100}xx"
+            return response
+        finally:
+            elapsed = time.perf_counter() - started
+            breaker.record(elapsed, outcome in ("error", "5xx"))
+            self._record(upstream, elapsed, outcome == "error")
+            UPSTREAM_SECONDS.observe(elapsed, upstream, method, outcome)
+            add_request_timing(upstream, elapsed)
+
+    def get(self, upstream, url, **kwargs):
+        return self.request(upstream, "GET", url, **kwargs)
+
+    def post(self, upstream, url, **kwargs):
+        return self.request(upstream, "POST", url, **kwargs)
+
+    def _record(self, upstream, elapsed, failed):
+        with self._lock:
+            stats = self._latency.get(upstream)
+            if stats is None:
+                stats = self._latency[upstream] = {"calls": 0, "errors": 0, "seconds": 0.0, "maxSeconds": 0.0, "lastSeconds": 0.0}
+            stats["calls"] += 1
+            stats["errors"] += 1 if failed else 0
+            stats["seconds"] += elapsed
+            stats["lastSeconds"] = elapsed
+            if elapsed > stats["maxSeconds"]:
+                stats["maxSeconds"] = elapsed
+
+    def stats(self):
+        with self._lock:
+            stats = {upstream: dict(values) for upstream, values in self._latency.items()}
+            breakers = dict(self._breakers)
+        for upstream, breaker in breakers.items():
+            stats.setdefault(upstream, {})["circuit"] = breaker.stats()
+        return stats
+
+    def breaker_metrics(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [("circuit_state", "gauge", "Circuit breaker state by upstream: 0 closed, 1 half-open, 2 open.",
+                 [({"upstream": breaker.name}, STATE_VALUES[breaker.state]) for breaker in breakers])]
+
+    def reset(self):
+        # After fork: forget the parent's pooled sockets without closing them,
+        # since the parent may still be using them
+        with self._lock:
+            if self._pid != os.getpid():
+                self._sessions = {}
+                self._pid = os.getpid()
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+httpClient = HttpClient()
+registry.register_collector(httpClient.breaker_metrics)
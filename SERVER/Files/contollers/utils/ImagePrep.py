@@ -0,0 +1,52 @@
+import os, tempfile #type: ignore
+
+try:
+    from PIL import Image, ImageOps #type: ignore
+except ImportError:  # Pillow is optional; without it the original files are sent as-is
+    Image = None
+
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "1600"))
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "70"))
+DERIVATIVE_SUFFIX = ".ocr.jpg"
+
+
+def derivative_path(path):
+    return os.path.splitext(path)[0] + DERIVATIVE_SUFFIX
+
+
+def ocr_derivative(path):
+    # Returns the path to send to the OCR backend: a downscaled, grayscale,
+    # recompressed JPEG cached next to the original, or the original itself when
+    # it is not an image Pillow can read (e.g. a PDF) or Pillow is unavailable.
+    if Image is None:
+        return path
+
+    target = derivative_path(path)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return smaller_of(target, path)
+
+    temp_path = None
+    try:
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image).convert("L")
+            image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".ocr-")
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, "JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    except Exception as e:
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+        print(f"OCR preprocessing skipped for {path}: {e}")
+        return path
+
+    os.replace(temp_path, target)
+    original_size = os.path.getsize(path)
+    derived_size = os.path.getsize(target)
+    print(f"OCR derivative for {path}: {original_size} -> {derived_size} bytes ({100 - derived_size * 100 // max(original_size, 1)}% smaller)")
+    return smaller_of(target, path)
+
+
+def smaller_of(derivative, original):
+    # An original that is already small can beat its derivative; the derivative
+    # stays on disk so the comparison is not repeated as image work.
+    return derivative if os.path.getsize(derivative) < os.path.getsize(original) else original
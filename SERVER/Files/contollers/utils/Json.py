@@ -0,0 +1,47 @@
+import datetime, decimal, json #type: ignore
+from bson import ObjectId #type: ignore
+from bson.decimal128 import Decimal128 #type: ignore
+
+try:
+    import orjson #type: ignore
+except ImportError:  # orjson is optional; without it the stdlib encoder is used
+    orjson = None
+
+# One encoder for every response: BSON types are converted during the single
+# serialization pass, so handlers can return documents straight from MongoDB.
+#   ObjectId   -> "65f0c3..."
+#   datetime   -> ISO 8601, "2024-03-12T09:30:00.123000+00:00" (naive values are UTC)
+#   Decimal128 -> "12.50", as a string so no precision is lost
+# Both encoders must print the same thing, so orjson is told naive datetimes
+# are UTC and bson_default gives them the same offset.
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC if orjson is not None else 0
+
+
+def bson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=bson_default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=bson_default, separators=(",", ":")).encode()
+
+def dumps(obj):
+    return dumps_bytes(obj).decode()
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
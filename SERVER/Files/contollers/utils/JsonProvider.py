@@ -0,0 +1,28 @@
+from flask.json.provider import DefaultJSONProvider #type: ignore
+from contollers.utils.Json import orjson,bson_default,dumps_bytes,loads
+
+
+class BsonJSONProvider(DefaultJSONProvider):
+    # Flask JSON provider backed by contollers.utils.Json. orjson is used when
+    # it is installed; otherwise this is Flask's encoder with bson_default as
+    # the fallback. Keys keep their insertion order in both cases.
+
+    default = staticmethod(bson_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for stdlib options (indent, ...) get the stdlib encoder
+        if orjson is not None and not kwargs:
+            return dumps_bytes(obj).decode()
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,159 @@
+import contextvars, os, threading #type: ignore
+
+# Latency buckets in seconds, shared by every histogram unless one asks otherwise
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "paytrue")
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, label_values)} {format_value(value)}")
+        return lines
+
+
+class Histogram:
+    # Cumulative buckets as Prometheus expects them; observe() is a lock and a
+    # short scan, cheap enough to sit on every request and every DB call.
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = format_labels(self.labels, label_values, 'le="%s"' % format_value(bound))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = format_labels(self.labels, label_values, 'le="+Inf"')
+                series_labels = format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                lines.append(f"{self.name}_sum{series_labels} {format_value(total)}")
+                lines.append(f"{self.name}_count{series_labels} {count}")
+        return lines
+
+
+class Registry:
+    # Owns the metrics rendered by /metrics. Collectors are callables that
+    # return [(name, type, help, [(labels_dict, value), ...]), ...] and let
+    # components that already keep their own counters (caches, uploads, the job
+    # queue) be exported without double bookkeeping.
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(f"{METRICS_PREFIX}_{name}", help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(f"{METRICS_PREFIX}_{name}", help, labels, buckets))
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                name = f"{METRICS_PREFIX}_{name}"
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels.keys(), labels.values())} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "Time spent handling a request, by route.", ("method", "route", "status"))
+DB_SECONDS = registry.histogram("mongo_command_duration_seconds", "Time spent in MongoDB commands, by collection and command.", ("collection", "command"))
+DB_ERRORS = registry.counter("mongo_command_errors_total", "MongoDB commands that failed, by collection and command.", ("collection", "command"))
+UPSTREAM_SECONDS = registry.histogram("upstream_request_duration_seconds", "Time spent in outbound HTTP calls, by upstream.", ("upstream", "method", "outcome"))
+
+
+# Per-request breakdown used for the Server-Timing header. Only set while a
+# request is being handled; background threads record metrics without it.
+_requestTimings = contextvars.ContextVar("request_timings", default=None)
+
+def start_request_timings():
+    timings = {}
+    _requestTimings.set(timings)
+    return timings
+
+def end_request_timings():
+    _requestTimings.set(None)
+
+def add_request_timing(segment, seconds):
+    timings = _requestTimings.get()
+    if timings is not None:
+        calls, total = timings.get(segment, (0, 0.0))
+        timings[segment] = (calls + 1, total + seconds)
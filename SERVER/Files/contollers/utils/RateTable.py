@@ -0,0 +1,62 @@
+from array import array #type: ignore
+import time #type: ignore
+
+# Currencies held in every wallet (see addUser and globalWallet)
+WALLET_CURRENCIES = ("INR", "USD", "EUR", "GBP", "JPY", "CNY")
+
+
+class RateTable:
+    # Cross-rate matrix built from a single "latest rates for one base" fetch.
+    # matrix[i * n + j] is the rate for converting currencies[i] into currencies[j].
+
+    __slots__ = ("base", "currencies", "index", "matrix", "fetchedat")
+
+    def __init__(self, base, currencies, matrix, fetchedat=None):
+        self.base = base
+        self.currencies = tuple(currencies)
+        self.index = {currency: i for i, currency in enumerate(self.currencies)}
+        self.matrix = matrix
+        self.fetchedat = fetchedat if fetchedat is not None else time.time()
+
+    @classmethod
+    def from_base_rates(cls, base, base_rates, currencies=WALLET_CURRENCIES):
+        # base_rates maps currency -> units of that currency per one unit of base
+        missing = [c for c in currencies if not base_rates.get(c)]
+        if missing:
+            raise ValueError(f"Rate table for {base} is missing: {', '.join(missing)}")
+
+        per_base = [float(base_rates[c]) for c in currencies]
+        n = len(per_base)
+        matrix = array("d", bytes(8 * n * n))
+        for i in range(n):
+            row = i * n
+            for j in range(n):
+                matrix[row + j] = per_base[j] / per_base[i]
+        return cls(base, currencies, matrix)
+
+    def has(self, currency):
+        return currency in self.index
+
+    def rate(self, from_currency, to_currency):
+        i = self.index[from_currency]
+        j = self.index[to_currency]
+        return self.matrix[i * len(self.currencies) + j]
+
+    def row(self, to_currency):
+        # Rates from every currency into to_currency, in table order
+        n = len(self.currencies)
+        j = self.index[to_currency]
+        return [self.matrix[i * n + j] for i in range(n)]
+
+    def convert_many(self, amounts, to_currency):
+        # Convert {currency: amount} into to_currency in one pass over the
+        # destination column; returns (per-currency converted amounts, total).
+        n = len(self.currencies)
+        j = self.index[to_currency]
+        converted = {}
+        total = 0.0
+        for currency, amount in amounts.items():
+            value = amount * self.matrix[self.index[currency] * n + j]
+            converted[currency] = value
+            total += value
+        return converted, total
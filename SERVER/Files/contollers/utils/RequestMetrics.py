@@ -0,0 +1,46 @@
+import os, time #type: ignore
+from flask import g, request #type: ignore
+from contollers.utils.Metrics import REQUEST_SECONDS,start_request_timings,end_request_timings
+
+# Adds a Server-Timing header (mongo, each upstream, app = the remainder, total)
+# so browser devtools and the load test can see where a slow request went
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+
+def server_timing_header(timings, total):
+    parts = []
+    accounted = 0.0
+    for segment, (calls, seconds) in sorted(timings.items()):
+        accounted += seconds
+        parts.append(f'{segment};dur={seconds * 1000:.2f};desc="{calls} call{"" if calls == 1 else "s"}"')
+    parts.append(f"app;dur={max(total - accounted, 0.0) * 1000:.2f}")
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def instrument_app(app, server_timing=SERVER_TIMING):
+    # Per-route latency histogram for every request. Routes are labelled by
+    # their rule (/api/getwallet), never the raw path, to keep series bounded.
+
+    @app.before_request
+    def start_timer():
+        g.requestStarted = time.perf_counter()
+        g.requestTimings = start_request_timings()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get("requestStarted")
+        if started is None:
+            return response
+        total = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(total, request.method, route, str(response.status_code))
+        if server_timing:
+            response.headers["Server-Timing"] = server_timing_header(g.requestTimings, total)
+        return response
+
+    @app.teardown_request
+    def clear_timings(error=None):
+        end_request_timings()
+
+    return app
@@ -0,0 +1,70 @@
+import base64, hashlib, hmac, json, os, secrets, time #type: ignore
+
+
+class TokenError(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode((text + "=" * (-len(text) % 4)).encode())
+
+
+def load_keys(keys_env, active_env):
+    # Keys come from e.g. TOKEN_KEYS="2024a:secret,2024b:secret" and
+    # TOKEN_ACTIVE_KEY="2024b". New tokens are signed with the active key while
+    # every listed key still verifies, so keys can be rotated without
+    # invalidating tokens signed by the previous one.
+    keys = {}
+    for entry in (os.getenv(keys_env) or "").split(","):
+        if ":" in entry:
+            kid, secret = entry.split(":", 1)
+            keys[kid.strip()] = secret.strip().encode()
+    if not keys:
+        print(f"{keys_env} is not set; using a random per-process signing key")
+        keys = {"local": secrets.token_bytes(32)}
+    active = os.getenv(active_env) or next(reversed(keys))
+    if active not in keys:
+        raise ValueError(f"{active_env}={active} is not one of the keys in {keys_env}")
+    return keys, active
+
+
+class TokenSigner:
+    # Compact HMAC-SHA256 signed tokens: base64url(json payload).base64url(mac).
+    # The payload carries the signing key id ("kid") and an expiry ("exp").
+
+    def __init__(self, keys, active):
+        self.keys = keys
+        self.active = active
+
+    def sign(self, payload, ttl):
+        body = dict(payload, kid=self.active, exp=int(time.time() + ttl))
+        encoded = _b64encode(json.dumps(body, separators=(",", ":")).encode())
+        return f"{encoded}.{self._mac(self.active, encoded)}"
+
+    def verify(self, token):
+        # Every way a client-supplied token can be wrong raises TokenError
+        try:
+            encoded, mac = token.split(".", 1)
+            body = json.loads(_b64decode(encoded))
+            mac = mac.encode("ascii")
+        except Exception:
+            raise TokenError("Malformed token")
+        if not isinstance(body, dict):
+            raise TokenError("Malformed token")
+        kid = body.get("kid")
+        if not isinstance(kid, str) or kid not in self.keys:
+            raise TokenError("Unknown signing key")
+        if not hmac.compare_digest(mac, self._mac(kid, encoded).encode("ascii")):
+            raise TokenError("Invalid token signature")
+        exp = body.get("exp")
+        if not isinstance(exp, (int, float)) or isinstance(exp, bool):
+            raise TokenError("Malformed token")
+        if exp < time.time():
+            raise TokenError("Token expired")
+        return body
+
+    def _mac(self, kid, encoded):
+        return _b64encode(hmac.new(self.keys[kid], encoded.encode(), hashlib.sha256).digest())
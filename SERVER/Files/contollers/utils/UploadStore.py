@@ -0,0 +1,97 @@
+import hashlib, os, re, tempfile, threading, time #type: ignore
+from concurrent.futures import ThreadPoolExecutor #type: ignore
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "3"))
+
+EXTENSION = re.compile(r"^\.[a-z0-9]{1,10}$")
+
+
+class UploadStore:
+    # Content-addressed storage for uploaded files. Each part is streamed to a
+    # temporary file in chunks while being hashed, then moved to
+    # <folder>/<sha256><ext>. Identical content is stored once, and client
+    # supplied filenames never decide where bytes land on disk.
+
+    def __init__(self, chunk_size=UPLOAD_CHUNK_SIZE, workers=UPLOAD_WORKERS):
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.deduplicated = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _pool(self):
+        # Created on first use in each process so a forked worker never inherits a dead pool
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload")
+                self._pid = os.getpid()
+            return self._executor
+
+    def save(self, file_storage, folder):
+        started = time.perf_counter()
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+        extension = os.path.splitext(file_storage.filename or "")[1].lower()
+        if not EXTENSION.match(extension):
+            extension = ""
+
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                stream = file_storage.stream
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            filename = digest.hexdigest() + extension
+            final_path = os.path.join(folder, filename)
+            duplicate = os.path.exists(final_path)
+            if duplicate:
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, final_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._record(size, time.perf_counter() - started, duplicate)
+        return filename
+
+    def save_many(self, parts):
+        # parts: [(file_storage, folder), ...]; returns stored filenames in order
+        futures = [self._pool().submit(self.save, file_storage, folder) for file_storage, folder in parts]
+        return [future.result() for future in futures]
+
+    def _record(self, size, elapsed, duplicate):
+        with self._lock:
+            self.uploads += 1
+            self.deduplicated += 1 if duplicate else 0
+            self.bytes += size
+            self.seconds += elapsed
+            if elapsed > self.max_seconds:
+                self.max_seconds = elapsed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "bytes": self.bytes,
+                "seconds": round(self.seconds, 6),
+                "maxSeconds": round(self.max_seconds, 6),
+                "bytesPerSecond": round(self.bytes / self.seconds, 1) if self.seconds else 0,
+            }
@@ -0,0 +1,98 @@
+'''
+    Production entry point:
+
+        gunicorn -c gunicorn.conf.py
+
+    Every setting below can be overridden from the environment, so the same file
+    serves a laptop and a production host. `python app.py` remains the local
+    development server.
+
+    Sizing
+    ------
+    Requests here spend most of their time waiting on MongoDB and the
+    exchange-rate / OCR / KYC upstreams. Run the load test against this config
+    with SERVER_TIMING=true:
+
+        python benchmarks/loadtest.py --base-url http://127.0.0.1:8080 --concurrency 8 32 64
+
+    Then read the Server-Timing "app" share of each request (CPU time in Python)
+    against "total":
+
+    * WEB_CONCURRENCY (processes): one per CPU core. The GIL limits each process
+      to about one core of Python work, so extra processes beyond the core
+      count only add memory and Mongo connections.
+    * GUNICORN_THREADS (threads per process): about total / app at the p50.
+      For example, 40ms total with 5ms of app time is roughly 8 threads. Raise
+      it while throughput keeps growing and p95 holds. Stop once p95 rises
+      faster than req/s, because the process is then CPU bound.
+    * MONGO_MAX_POOL_SIZE must be at least threads + OCR_WORKERS + 2 (the
+      verification workers and the migration each hold a connection). The
+      whole host opens up to WEB_CONCURRENCY * MONGO_MAX_POOL_SIZE
+      connections, which must stay below the server's connection limit.
+    * HTTP_POOL_SIZE: per upstream host, at least the thread count. Otherwise
+      threads queue for a socket to the exchange-rate API under load.
+
+    The defaults follow these rules but were not measured on production hardware.
+    Re-run the load test and benchmarks/compare.py after changing them.
+'''
+import multiprocessing, os, time #type: ignore
+
+wsgi_app = "app:app"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8080")
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# Recycle each worker after a bounded number of requests. The jitter keeps all
+# workers from restarting at the same moment.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+# On SIGTERM or a recycle, workers stop accepting and get graceful_timeout
+# seconds to finish in-flight requests. timeout must cover the slowest legitimate
+# request: an upstream read timeout plus retries.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+SHUTDOWN_RESERVE = float(os.getenv("GUNICORN_SHUTDOWN_RESERVE", "2"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Importing app.py opens no connections, so it can be loaded once in the master
+# and shared copy-on-write. Each worker still builds its own pools after fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Without configured keys every process signs with its own random key (see
+# contollers/utils/Tokens.py). Only a preloaded app shares one key with all
+# workers; otherwise a quote confirmed on another worker is rejected and
+# session tokens are ignored there.
+if not preload_app and workers > 1:
+    for keys_env in ("QUOTE_TOKEN_KEYS", "SESSION_TOKEN_KEYS"):
+        if not os.getenv(keys_env):
+            print(f"Warning: {keys_env} is not set and GUNICORN_PRELOAD=false; tokens signed by one worker will not verify on the others")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # Drop anything inherited from the master. The Mongo client and the HTTP
+    # sessions are rebuilt on first use in this worker.
+    from contollers.db.Database import close_client
+    from contollers.utils.HttpClient import httpClient
+    close_client()
+    httpClient.reset()
+
+
+def worker_exit(server, worker):
+    # Let the verification workers finish their current job, stop refilling
+    # the KYC code pool, then close this worker's pools. All the waiting shares
+    # one deadline, leaving SHUTDOWN_RESERVE seconds of graceful_timeout for the
+    # pools to close before the master kills the worker.
+    from contollers.auth.Authentication import verificationWorkers,kycCodes
+    from contollers.db.Database import close_client
+    from contollers.utils.HttpClient import httpClient
+    deadline = time.monotonic() + max(graceful_timeout - SHUTDOWN_RESERVE, 0)
+    verificationWorkers.stop(timeout=max(deadline - time.monotonic(), 0))
+    kycCodes.stop(timeout=max(deadline - time.monotonic(), 0))
+    httpClient.close()
+    close_client()
@@ -0,0 +1,42 @@
+import os, sys #type: ignore
+
+# Tests import the app's modules the same way app.py does, from SERVER/Files.
+# Run them from there with `python -m pytest tests`. The MongoDB-facing tests use
+# mongomock (4.x needs pymongo<4.9 for bulk_write) and are skipped without it.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeRequest:
+    # The parts of a Flask request the handlers read
+    def __init__(self, json=None, headers=None):
+        self.json = json
+        self.headers = headers or {}
+
+
+class ArrayFilterCollection:
+    # mongomock does not implement array_filters. This wraps a mongomock
+    # collection and applies the one shape WalletStore sends with them, an $inc
+    # of 'balance.$[cN].amount' with filters {'cN.currency': code}, to the first
+    # document matching the query. Everything else goes straight to mongomock.
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def update_one(self, query, update, array_filters=None, **kwargs):
+        from pymongo.results import UpdateResult #type: ignore
+        if not array_filters:
+            return self._collection.update_one(query, update, **kwargs)
+        doc = self._collection.find_one(query)
+        if doc is None:
+            return UpdateResult({'n': 0, 'nModified': 0}, True)
+        currencies = {path.split('.')[0]: value for f in array_filters for path, value in f.items()}
+        for path, delta in update['$inc'].items():
+            currency = currencies[path.split('$[')[1].split(']')[0]]
+            for entry in doc['balance']:
+                if entry['currency'] == currency:
+                    entry['amount'] += delta
+        self._collection.update_one({'_id': doc['_id']}, {'$set': {'balance': doc['balance']}})
+        return UpdateResult({'n': 1, 'nModified': 1}, True)
@@ -0,0 +1,74 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("flask")
+
+from conftest import ArrayFilterCollection
+from contollers.auth import Authentication
+from contollers.db.WalletStore import WalletStore
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = mongomock.MongoClient().db
+    monkeypatch.setattr(Authentication, "walletStore", WalletStore(ArrayFilterCollection(db.wallets)))
+    monkeypatch.setattr(Authentication, "insert_transactions", lambda transactions: db.transactions.insert_many(transactions))
+    monkeypatch.setattr(Authentication, "record_conversions", lambda transactions: None)
+    monkeypatch.setattr(Authentication, "invalidate_wallet", lambda uid: None)
+    return db
+
+
+def convert(uid, index, amount, rate=80):
+    item = {"uid": uid, "fromCurrency": "USD", "toCurrency": "INR", "amount": amount, "toDigital": True}
+    return (index, item, amount * rate, rate)
+
+
+def accepted_result(index):
+    return {"index": index, "success": True, "data": {}}
+
+
+def run_batch(db, accepted, before_write=None):
+    store = Authentication.walletStore
+    wallets = {uid: store.find(uid) for uid in accepted}
+    if before_write:
+        before_write()
+    results = [accepted_result(index) for items in accepted.values() for index, *_ in items]
+    Authentication.apply_batch_conversions(wallets, accepted, results)
+    return results
+
+
+def test_every_wallet_applies_in_one_bulk_write(db):
+    Authentication.walletStore.create("a", {"USD": 10, "INR": 0})
+    Authentication.walletStore.create("b", {"USD": 10, "INR": 0})
+    results = run_batch(db, {"a": [convert("a", 0, 4), convert("a", 1, 5)], "b": [convert("b", 2, 10)]})
+
+    assert [result["success"] for result in results] == [True, True, True]
+    assert all("transactionId" in result for result in results)
+    assert Authentication.walletStore.find("a").balances == {"USD": 1, "INR": 720}
+    assert Authentication.walletStore.find("b").balances == {"USD": 0, "INR": 800}
+    assert db.transactions.count_documents({}) == 3
+
+
+def test_partial_match_reports_only_the_wallets_that_changed(db):
+    Authentication.walletStore.create("a", {"USD": 10, "INR": 0})
+    Authentication.walletStore.create("b", {"USD": 10, "INR": 0})
+    # A concurrent debit on b lands between the read and the bulk write
+    spend_b = lambda: db.wallets.update_one({"uid": "b"}, {"$inc": {"balances.USD": -5}})
+    results = run_batch(db, {"a": [convert("a", 0, 4)], "b": [convert("b", 1, 6)]}, before_write=spend_b)
+
+    assert results[0]["success"] and "transactionId" in results[0]
+    assert not results[1]["success"]
+    assert results[1]["message"] == "Wallet balance changed during the batch, please try again"
+    assert Authentication.walletStore.find("a").balances == {"USD": 6, "INR": 320}
+    assert Authentication.walletStore.find("b").balances == {"USD": 5, "INR": 0}
+    assert [t["uid"] for t in db.transactions.find()] == ["a"]
+
+
+def test_legacy_wallets_convert_item_by_item(db):
+    db.wallets.insert_one({"uid": "old", "balance": [{"currency": "USD", "amount": 10}, {"currency": "INR", "amount": 0}]})
+    results = run_batch(db, {"old": [convert("old", 0, 6), convert("old", 1, 6)]})
+
+    assert results[0]["success"]
+    assert not results[1]["success"]
+    assert results[1]["message"] == "Insufficient balance in USD"
+    assert Authentication.walletStore.find("old").balances == {"USD": 4, "INR": 480}
@@ -0,0 +1,59 @@
+import threading, time #type: ignore
+import pytest #type: ignore
+from contollers.utils.Cache import TTLCache
+
+
+def test_get_or_load_runs_one_loader_for_concurrent_misses():
+    cache = TTLCache("test", ttl=60)
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(1)
+        return "value"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("key", loader))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["value"] * 8
+    assert cache.get("key") == "value"
+
+
+def test_get_or_load_shares_a_loader_error_and_retries_next_time():
+    cache = TTLCache("test", ttl=60)
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("key", lambda: (_ for _ in ()).throw(RuntimeError("down")))
+    assert cache.stats()["loadErrors"] == 1
+    assert cache.get_or_load("key", lambda: 5) == 5
+
+
+def test_none_results_are_not_stored():
+    cache = TTLCache("test", ttl=60)
+    assert cache.get_or_load("key", lambda: None) is None
+    assert cache.get_or_load("key", lambda: 1) == 1
+
+
+def test_entries_expire_and_lru_evicts():
+    cache = TTLCache("test", ttl=0.05, maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+
+def test_add_only_stores_once_while_live():
+    cache = TTLCache("test", ttl=60)
+    assert cache.add("quote", True)
+    assert not cache.add("quote", True)
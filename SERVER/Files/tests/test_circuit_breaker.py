@@ -0,0 +1,49 @@
+import pytest #type: ignore
+from contollers.utils.CircuitBreaker import CircuitBreaker,CircuitOpenError,CLOSED,OPEN,HALF_OPEN
+
+
+def breaker(**settings):
+    options = dict(window=4, min_calls=4, failure_rate=0.5, slow_seconds=1, slow_rate=0.75, open_seconds=60, half_open_calls=1)
+    options.update(settings)
+    return CircuitBreaker("test", **options)
+
+
+def test_opens_once_enough_calls_fail():
+    circuit = breaker()
+    for failed in (False, True, False):
+        circuit.before_call()
+        circuit.record(0.1, failed)
+    assert circuit.state == CLOSED
+    circuit.before_call()
+    circuit.record(0.1, True)
+    assert circuit.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    assert circuit.stats()["rejected"] == 1
+
+
+def test_opens_on_slow_calls():
+    circuit = breaker()
+    for elapsed in (2, 2, 2, 0.1):
+        circuit.before_call()
+        circuit.record(elapsed, False)
+    assert circuit.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    circuit = breaker(min_calls=1, open_seconds=0)
+    circuit.before_call()
+    circuit.record(0.1, True)
+    assert circuit.state == OPEN
+
+    circuit.before_call()
+    assert circuit.state == HALF_OPEN
+    # Only half_open_calls probes are let through at a time
+    with pytest.raises(CircuitOpenError):
+        circuit.before_call()
+    circuit.record(0.1, True)
+    assert circuit.state == OPEN
+
+    circuit.before_call()
+    circuit.record(0.1, False)
+    assert circuit.state == CLOSED
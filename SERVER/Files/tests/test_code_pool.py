@@ -0,0 +1,80 @@
+import itertools, time #type: ignore
+from contollers.utils.CodePool import CodePool
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def counter():
+    codes = itertools.count(1)
+    return lambda: f"code-{next(codes)}"
+
+
+def test_refills_to_high_water_and_hands_out_codes_oldest_first():
+    pool = CodePool("test", counter(), low_water=2, high_water=5, poll_interval=10)
+    pool.start()
+    try:
+        assert wait_for(lambda: pool.depth() == 5)
+        assert [pool.take() for _ in range(3)] == ["code-1", "code-2", "code-3"]
+        # Below low_water, take() wakes the thread instead of waiting for the poll
+        pool.take()
+        assert wait_for(lambda: pool.depth() == 5)
+        assert pool.take() == "code-5"
+        stats = pool.stats()
+        assert (stats["hits"], stats["misses"], stats["fetches"], stats["fetchErrors"]) == (5, 0, 9, 0)
+        assert stats["running"]
+    finally:
+        pool.stop(timeout=5)
+
+
+def test_an_empty_pool_is_a_miss():
+    pool = CodePool("test", counter())
+    assert pool.take() is None
+    assert pool.stats()["misses"] == 1
+
+
+def test_codes_older_than_ttl_are_evicted_unused():
+    pool = CodePool("test", counter(), low_water=1, high_water=3, ttl=0.1)
+    assert pool._refill()
+    assert pool.depth() == 3
+    time.sleep(0.15)
+    assert pool.take() is None
+    assert pool.stats()["evictions"] == 3
+
+
+def test_failed_fetches_back_off():
+    calls = []
+    def unavailable():
+        calls.append(time.monotonic())
+        raise ConnectionError("upstream down")
+    pool = CodePool("test", unavailable, poll_interval=0.05)
+    pool.start()
+    try:
+        time.sleep(0.6)
+    finally:
+        pool.stop(timeout=5)
+    # Waits of 0.1, 0.2 and 0.4s; a fixed poll would have fetched about 12 times
+    assert 2 <= len(calls) <= 5
+    assert all(b - a > 0.08 for a, b in zip(calls, calls[1:]))
+    assert pool.stats()["fetchErrors"] == len(calls)
+    assert pool.depth() == 0
+
+
+def test_a_forked_process_starts_with_an_empty_pool():
+    pool = CodePool("test", counter(), low_water=1, high_water=3, poll_interval=10)
+    pool.start()
+    assert wait_for(lambda: pool.depth() == 3)
+    pool.stop(timeout=5)
+    inherited = {"code-1", "code-2", "code-3"}
+    # As seen from a child process: the pool was started under another pid
+    pool._pid = -1
+    pool.start()
+    try:
+        assert wait_for(lambda: pool.depth() == 3)
+        assert {pool.take() for _ in range(3)}.isdisjoint(inherited)
+    finally:
+        pool.stop(timeout=5)
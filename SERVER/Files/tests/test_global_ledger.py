@@ -0,0 +1,57 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+
+from contollers.utils.GlobalLedger import GlobalLedger,GlobalWalletError
+
+
+def shard_amounts(ledger, currency):
+    return sorted(doc["amount"] for doc in ledger.collection.find({"currency": currency, "shard": {"$exists": True}}))
+
+
+@pytest.fixture
+def ledger():
+    ledger = GlobalLedger(mongomock.MongoClient().db.globalWallet, shards=4)
+    ledger.bootstrap([("USD", 400), ("INR", 4000)])
+    return ledger
+
+
+def test_bootstrap_splits_balances_once(ledger):
+    assert shard_amounts(ledger, "USD") == [100] * 4
+    assert not ledger.bootstrap([("USD", 1)])
+    assert {row["currency"]: row["amount"] for row in ledger.balances()} == {"INR": 4000, "USD": 400}
+
+
+def test_bootstrap_splits_a_legacy_wallet():
+    collection = mongomock.MongoClient().db.globalWallet
+    collection.insert_one({"balance": [{"currency": "USD", "amount": 80}]})
+    ledger = GlobalLedger(collection, shards=4)
+    assert ledger.bootstrap([("USD", 1)])
+    assert shard_amounts(ledger, "USD") == [20] * 4
+    assert collection.count_documents({"balance": {"$exists": True}}) == 0
+
+
+def test_debit_larger_than_any_shard_consolidates_first(ledger):
+    assert ledger.debit("USD", 250)
+    assert sum(shard_amounts(ledger, "USD")) == 150
+    assert min(shard_amounts(ledger, "USD")) >= 0
+
+
+def test_rebalance_evens_out_shards_and_keeps_the_total(ledger):
+    ledger.collection.update_one({"currency": "USD", "shard": 0}, {"$inc": {"amount": -100}})
+    ledger.collection.update_one({"currency": "USD", "shard": 1}, {"$inc": {"amount": 100}})
+    assert ledger.rebalance("USD")
+    assert shard_amounts(ledger, "USD") == [100] * 4
+
+
+def test_debit_beyond_the_total_is_refused(ledger):
+    with pytest.raises(GlobalWalletError) as error:
+        ledger.debit("USD", 401)
+    assert error.value.status_code == 400
+    assert sum(shard_amounts(ledger, "USD")) == 400
+
+
+def test_transfer_gives_the_debit_back_when_the_credit_fails(ledger):
+    with pytest.raises(GlobalWalletError):
+        ledger.transfer("EUR", 5, "USD", 50)
+    assert sum(shard_amounts(ledger, "USD")) == 400
@@ -0,0 +1,118 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("flask")
+
+from bson import ObjectId #type: ignore
+from pymongo.errors import PyMongoError #type: ignore
+from conftest import FakeRequest
+from contollers.auth import Authentication
+from contollers.db.WalletStore import WalletStore
+
+
+@pytest.fixture
+def wallets(monkeypatch):
+    store = WalletStore(mongomock.MongoClient().db.wallets)
+    monkeypatch.setattr(Authentication, "walletStore", store)
+    monkeypatch.setattr(Authentication, "find_wallet", store.find)
+    monkeypatch.setattr(Authentication, "invalidate_wallet", lambda uid: None)
+    monkeypatch.setattr(Authentication, "find_user_profile", lambda object_id: object())
+    monkeypatch.setattr(Authentication, "get_exchange_rate", lambda from_currency, to_currency: 80.0)
+    monkeypatch.setattr(Authentication, "insert_transaction", store.collection.database.transactions.insert_one)
+    monkeypatch.setattr(Authentication, "record_conversions", lambda transactions: None)
+    return store
+
+
+def conversion(uid, amount, **extra):
+    return dict({"uid": uid, "fromCurrency": "USD", "toCurrency": "INR", "amount": amount, "toDigital": True}, **extra)
+
+
+def test_home_delivery_refunds_the_user_when_the_ledger_fails(wallets, monkeypatch):
+    uid = str(ObjectId())
+    wallets.create(uid, {"USD": 10, "INR": 0})
+
+    def unavailable(*args):
+        raise PyMongoError("connection reset")
+    monkeypatch.setattr(Authentication.globalLedger, "transfer", unavailable)
+
+    _, status = Authentication.homeDelivery(FakeRequest(conversion(uid, 4, confirm=True, delivery="Home")))
+    assert status == 500
+    assert wallets.find(uid).balances == {"USD": 10, "INR": 0}
+
+
+@pytest.mark.parametrize("currencies", [("USD", "inr"), ("usd", "INR"), ("USD", "IN.R")])
+def test_home_delivery_rejects_bad_currency_codes(wallets, monkeypatch, currencies):
+    monkeypatch.setattr(Authentication, "get_exchange_rate", lambda *pair: pytest.fail("bad codes must not reach the rate API"))
+    payload = dict(conversion(str(ObjectId()), 1), fromCurrency=currencies[0], toCurrency=currencies[1])
+    _, status = Authentication.homeDelivery(FakeRequest(payload))
+    assert status == 400
+
+
+@pytest.fixture
+def quotes(wallets, monkeypatch):
+    from contollers.db import Repository
+    collection = mongomock.MongoClient().db.redeemedQuotes
+    monkeypatch.setattr(Repository, "redeemedQuoteCollection", collection)
+    Authentication.redeemedQuotes.clear()
+    yield collection
+    Authentication.redeemedQuotes.clear()
+
+
+def quote(uid, amount):
+    response, status = Authentication.homeDelivery(FakeRequest(conversion(uid, amount)))
+    assert status == 200
+    return response["data"]["quoteToken"]
+
+
+def confirm(uid, amount, token):
+    return Authentication.homeDelivery(FakeRequest(conversion(uid, amount, confirm=True, quoteToken=token)))
+
+
+def test_home_delivery_rejects_a_malformed_quote_token(quotes, wallets):
+    uid = str(ObjectId())
+    wallets.create(uid, {"USD": 10, "INR": 0})
+    response, status = confirm(uid, 1, "WzFd.AAAA")
+    assert status == 400 and response["message"].startswith("Invalid quote")
+
+
+def test_a_quote_confirms_once_across_processes(quotes, wallets):
+    uid = str(ObjectId())
+    wallets.create(uid, {"USD": 10, "INR": 0})
+    token = quote(uid, 1)
+    assert confirm(uid, 1, token)[1] == 200
+    # Another worker has no local memory of the quote; the shared claim still refuses it
+    Authentication.redeemedQuotes.clear()
+    response, status = confirm(uid, 1, token)
+    assert status == 400 and "already used" in response["message"]
+    assert wallets.find(uid).balances["USD"] == 9
+
+
+def test_a_failed_claim_leaves_the_quote_usable(quotes, wallets, monkeypatch):
+    uid = str(ObjectId())
+    wallets.create(uid, {"USD": 10, "INR": 0})
+    token = quote(uid, 1)
+    claim = Authentication.claim_quote
+
+    def unavailable_once(*args):
+        monkeypatch.setattr(Authentication, "claim_quote", claim)
+        raise PyMongoError("not primary")
+    monkeypatch.setattr(Authentication, "claim_quote", unavailable_once)
+
+    assert confirm(uid, 1, token)[1] == 500
+    assert confirm(uid, 1, token)[1] == 200
+
+
+def test_a_confirm_beaten_by_a_concurrent_debit_keeps_its_quote(quotes, wallets):
+    uid = str(ObjectId())
+    wallets.create(uid, {"USD": 10, "INR": 0})
+    token = quote(uid, 8)
+    real_transfer = wallets.transfer
+    wallets.transfer = lambda wallet, *args: wallets.debit(wallet, "USD", 5) and real_transfer(wallet, *args)
+
+    response, status = confirm(uid, 8, token)
+    assert status == 400 and "Insufficient" in response["message"]
+    assert quotes.count_documents({}) == 0
+
+    wallets.transfer = real_transfer
+    wallets.credit(wallets.find(uid), "USD", 5)
+    assert confirm(uid, 8, token)[1] == 200
@@ -0,0 +1,88 @@
+import threading, time #type: ignore
+from http.server import BaseHTTPRequestHandler,ThreadingHTTPServer #type: ignore
+import pytest #type: ignore
+
+requests = pytest.importorskip("requests")
+
+from contollers.utils.HttpClient import HttpClient
+
+
+class Upstream(BaseHTTPRequestHandler):
+    # Keep-alive test server. Paths: /ok, /slow, /flaky (503 twice, then 200)
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.calls.append((self.command, self.path, self.client_address[1]))
+        if self.path == "/slow":
+            time.sleep(0.5)
+        status = 200
+        if self.path == "/flaky" and sum(1 for _, path, _ in self.server.calls if path == "/flaky") <= 2:
+            status = 503
+        body = b"{}"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        # The timeout test hangs up on /slow; that is expected, not a server error
+        try:
+            super().handle()
+        except ConnectionError:
+            pass
+
+
+@pytest.fixture
+def upstream():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Upstream)
+    server.calls = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_default_read_timeout_bounds_every_call(upstream):
+    _, base = upstream
+    client = HttpClient(timeout=(1, 0.1), retries=0)
+    # With a Retry adapter requests reports an exhausted read timeout as a ConnectionError
+    with pytest.raises(requests.exceptions.RequestException, match="Read timed out"):
+        client.get("test", base + "/slow")
+    assert client.stats()["test"]["errors"] == 1
+    # An explicit timeout still wins over the default
+    assert client.get("test", base + "/slow", timeout=2).status_code == 200
+
+
+def test_gets_are_retried_on_503_but_posts_are_not(upstream):
+    server, base = upstream
+    client = HttpClient(retries=2, backoff=0)
+    assert client.post("test", base + "/flaky").status_code == 503
+    assert len(server.calls) == 1
+    assert client.get("test", base + "/flaky").status_code == 200
+    assert [method for method, _, _ in server.calls] == ["POST", "GET", "GET"]
+
+
+def test_one_pooled_session_per_host_reuses_connections(upstream):
+    server, base = upstream
+    client = HttpClient(retries=0)
+    for _ in range(3):
+        client.get("test", base + "/ok")
+    assert len({port for _, _, port in server.calls}) == 1
+    assert client._session(base + "/a") is client._session(base + "/b")
+    other_host = base.replace("127.0.0.1", "localhost")
+    assert client._session(other_host + "/a") is not client._session(base + "/a")
+    assert client.stats()["test"]["calls"] == 3
+
+
+def test_a_forked_process_gets_fresh_sessions(upstream):
+    _, base = upstream
+    client = HttpClient(retries=0)
+    parent = client._session(base + "/ok")
+    client._pid = -1  # as if this process had been forked
+    assert client._session(base + "/ok") is not parent
@@ -0,0 +1,52 @@
+import os, random #type: ignore
+import pytest #type: ignore
+from contollers.utils import ImagePrep
+
+
+def noisy_photo(path, size=(2000, 1200)):
+    Image = pytest.importorskip("PIL.Image")
+    rng = random.Random(1)
+    image = Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+    image.save(path, "PNG")
+    return path
+
+
+def test_large_photos_are_downscaled_grayscale_jpegs(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    original = noisy_photo(str(tmp_path / "id.png"))
+    sent = ImagePrep.ocr_derivative(original)
+    assert sent == ImagePrep.derivative_path(original)
+    with Image.open(sent) as image:
+        assert image.format == "JPEG" and image.mode == "L"
+        assert max(image.size) == ImagePrep.OCR_MAX_DIMENSION
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".ocr-")] == []
+
+
+def test_a_fresh_derivative_is_reused(tmp_path, monkeypatch):
+    pytest.importorskip("PIL.Image")
+    original = noisy_photo(str(tmp_path / "id.png"), size=(400, 300))
+    first = ImagePrep.ocr_derivative(original)
+    monkeypatch.setattr(ImagePrep.Image, "open", lambda path: pytest.fail("derivative should be reused"))
+    assert ImagePrep.ocr_derivative(original) == first
+
+
+def test_files_pillow_cannot_read_are_sent_as_is(tmp_path):
+    pytest.importorskip("PIL.Image")
+    pdf = tmp_path / "address.pdf"
+    pdf.write_bytes(b"%PDF-1.4 not an image")
+    assert ImagePrep.ocr_derivative(str(pdf)) == str(pdf)
+    assert os.listdir(tmp_path) == ["address.pdf"]
+
+
+def test_without_pillow_the_original_is_sent(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImagePrep, "Image", None)
+    path = tmp_path / "id.png"
+    path.write_bytes(b"anything")
+    assert ImagePrep.ocr_derivative(str(path)) == str(path)
+
+
+def test_an_original_smaller_than_its_derivative_wins(tmp_path):
+    derivative, original = tmp_path / "a.ocr.jpg", tmp_path / "a.jpg"
+    derivative.write_bytes(b"x" * 10)
+    original.write_bytes(b"x" * 5)
+    assert ImagePrep.smaller_of(str(derivative), str(original)) == str(original)
@@ -0,0 +1,70 @@
+import os, tempfile, time #type: ignore
+from contollers.jobs.JobQueue import JobQueue,JobWorkers
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_workers_survive_queue_errors_while_recording_outcomes():
+    queue = JobQueue(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+    complete, attempts = queue.complete, []
+
+    def locked_once(job_id, result):
+        attempts.append(job_id)
+        if len(attempts) == 1:
+            raise RuntimeError("database is locked")
+        return complete(job_id, result)
+
+    def always_locked(job_id, error):
+        raise RuntimeError("database is locked")
+
+    queue.complete, queue.fail = locked_once, always_locked
+    workers = JobWorkers(queue, {"ok": lambda job, progress: {"done": True}, "boom": lambda job, progress: 1 / 0}, concurrency=1, poll_interval=0.02)
+    workers.start()
+    try:
+        queue.enqueue("boom", {})
+        ok, _ = queue.enqueue("ok", {})
+        workers.notify()
+        # The failed job's outcome could not be stored, yet the thread went on;
+        # the completion was retried rather than the job marked failed
+        assert wait_for(lambda: queue.get(ok["id"])["status"] == "succeeded")
+        assert workers._threads[0].is_alive()
+    finally:
+        workers.stop(timeout=5)
+
+
+def test_jobs_run_once_and_report_progress():
+    queue = JobQueue(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+
+    def handler(job, progress):
+        progress("halfway")
+        return {"uid": job["payload"]["uid"]}
+
+    job, created = queue.enqueue("verify", {"uid": "u1"}, dedupe_key="u1")
+    duplicate, created_again = queue.enqueue("verify", {"uid": "u1"}, dedupe_key="u1")
+    assert created and not created_again and duplicate["id"] == job["id"]
+
+    workers = JobWorkers(queue, {"verify": handler}, concurrency=2, poll_interval=0.02)
+    workers.start()
+    try:
+        assert wait_for(lambda: queue.get(job["id"])["status"] == "succeeded")
+        assert queue.get(job["id"])["result"] == {"uid": "u1"}
+    finally:
+        workers.stop(timeout=5)
+
+
+def test_stop_timeout_bounds_the_whole_shutdown():
+    queue = JobQueue(os.path.join(tempfile.mkdtemp(), "jobs.sqlite3"))
+    workers = JobWorkers(queue, {"slow": lambda job, progress: time.sleep(2)}, concurrency=4, poll_interval=0.02)
+    workers.start()
+    for _ in range(4):
+        queue.enqueue("slow", {})
+    workers.notify()
+    assert wait_for(lambda: queue.depth().get("running", 0) == 4)
+    started = time.monotonic()
+    workers.stop(timeout=0.3)
+    assert time.monotonic() - started < 1
@@ -0,0 +1,66 @@
+import datetime, decimal, json #type: ignore
+import pytest #type: ignore
+
+from bson import ObjectId #type: ignore
+from bson.decimal128 import Decimal128 #type: ignore
+from contollers.utils import Json
+
+DOCUMENT = {
+    "_id": ObjectId("65f0c3a1b2c3d4e5f6a7b8c9"),
+    "zeta": 1,
+    "alpha": [{"amount": Decimal128("12.50")}, decimal.Decimal("0.10")],
+    "created": datetime.datetime(2024, 3, 12, 9, 30, 0, 123000),
+    "settled": datetime.datetime(2024, 3, 12, 11, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+    "day": datetime.date(2024, 3, 12),
+}
+EXPECTED = {
+    "_id": "65f0c3a1b2c3d4e5f6a7b8c9",
+    "zeta": 1,
+    "alpha": [{"amount": "12.50"}, "0.10"],
+    "created": "2024-03-12T09:30:00.123000+00:00",
+    "settled": "2024-03-12T11:00:00+02:00",
+    "day": "2024-03-12",
+}
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=Json.bson_default, separators=(",", ":"))
+
+
+def test_bson_types_are_encoded_in_one_pass():
+    assert json.loads(Json.dumps(DOCUMENT)) == EXPECTED
+    assert list(Json.loads(Json.dumps(DOCUMENT))) == list(DOCUMENT)
+
+
+def test_naive_datetimes_are_utc_in_both_encoders():
+    assert stdlib_dumps(DOCUMENT) == json.dumps(EXPECTED, separators=(",", ":"))
+    if Json.orjson is not None:
+        assert Json.dumps(DOCUMENT) == stdlib_dumps(DOCUMENT)
+
+
+def test_the_stdlib_encoder_is_used_without_orjson(monkeypatch):
+    monkeypatch.setattr(Json, "orjson", None)
+    assert Json.dumps(DOCUMENT) == stdlib_dumps(DOCUMENT)
+
+
+def test_unknown_types_are_rejected():
+    with pytest.raises(TypeError):
+        Json.bson_default(object())
+
+
+@pytest.mark.parametrize("with_orjson", [True, False])
+def test_flask_responses_use_the_bson_encoder(monkeypatch, with_orjson):
+    flask = pytest.importorskip("flask")
+    from contollers.utils import JsonProvider
+    if not with_orjson:
+        monkeypatch.setattr(JsonProvider, "orjson", None)
+        monkeypatch.setattr(Json, "orjson", None)
+    app = flask.Flask(__name__)
+    app.json = JsonProvider.BsonJSONProvider(app)
+    with app.app_context():
+        response = flask.jsonify(DOCUMENT)
+        assert response.mimetype == "application/json"
+        body = response.get_data(as_text=True)
+        assert json.loads(body) == EXPECTED
+        assert list(json.loads(body)) == list(DOCUMENT)
+        assert app.json.loads(app.json.dumps(DOCUMENT)) == EXPECTED
@@ -0,0 +1,28 @@
+import pytest #type: ignore
+from contollers.utils.RateTable import RateTable
+
+
+def table():
+    return RateTable.from_base_rates("USD", {"USD": 1, "INR": 80, "EUR": 0.5}, currencies=("USD", "INR", "EUR"))
+
+
+def test_cross_rates_come_from_the_base_rates():
+    rates = table()
+    assert rates.rate("USD", "INR") == 80
+    assert rates.rate("INR", "USD") == pytest.approx(1 / 80)
+    assert rates.rate("EUR", "INR") == pytest.approx(160)
+    assert rates.rate("INR", "INR") == 1
+
+
+def test_row_and_convert_many_use_the_destination_column():
+    rates = table()
+    assert rates.row("USD") == pytest.approx([1, 1 / 80, 2])
+    converted, total = rates.convert_many({"INR": 160, "EUR": 1}, "USD")
+    assert converted == pytest.approx({"INR": 2, "EUR": 2})
+    assert total == pytest.approx(4)
+
+
+def test_missing_rates_are_rejected():
+    with pytest.raises(ValueError):
+        RateTable.from_base_rates("USD", {"USD": 1, "INR": 0}, currencies=("USD", "INR"))
+    assert not table().has("GBP")
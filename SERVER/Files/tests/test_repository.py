@@ -0,0 +1,45 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+
+from bson import ObjectId #type: ignore
+from contollers.db import Repository
+
+
+class RecordingCollection:
+    # Remembers the projection of every find_one
+    def __init__(self, collection):
+        self.collection = collection
+        self.projections = []
+
+    def find_one(self, query, projection=None, **kwargs):
+        self.projections.append(dict(projection or {}))
+        return self.collection.find_one(query, projection, **kwargs)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    users = RecordingCollection(mongomock.MongoClient().db.users)
+    monkeypatch.setattr(Repository, "userCollection", users)
+    Repository.userCache.clear()
+    yield users
+    Repository.userCache.clear()
+
+
+def test_find_user_name_reads_only_the_name(users):
+    user_id = users.collection.insert_one({"name": "Ann", "email": "a@x", "homeBank": [{"bankName": "B", "balance": 1}]}).inserted_id
+    user = Repository.find_user_name(user_id)
+    assert (user.id, user.name) == (user_id, "Ann")
+    assert not hasattr(user, "homeBank")
+    assert users.projections == [{"name": 1}]
+
+
+def test_find_user_name_uses_a_cached_profile(users):
+    user_id = users.collection.insert_one({"name": "Ann", "homeBank": []}).inserted_id
+    Repository.find_user_profile(user_id)
+    assert Repository.find_user_name(user_id).name == "Ann"
+    assert users.projections == [{"name": 1, "homeBank": 1}]
+
+
+def test_unknown_users_are_none(users):
+    assert Repository.find_user_name(ObjectId()) is None
@@ -0,0 +1,66 @@
+import types #type: ignore
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("flask")
+
+from bson import ObjectId #type: ignore
+from pymongo.errors import PyMongoError #type: ignore
+from conftest import FakeRequest
+from contollers.auth import Authentication
+from contollers.db.WalletStore import WalletStore
+
+
+@pytest.fixture
+def wallets(monkeypatch):
+    # A standalone server: the sweep runs without a transaction (session=None)
+    store = WalletStore(mongomock.MongoClient().db.wallets)
+    monkeypatch.setattr(Authentication, "walletStore", store)
+    monkeypatch.setattr(Authentication, "invalidate_wallet", lambda uid: None)
+    monkeypatch.setattr(Authentication, "invalidate_user", lambda object_id: None)
+    monkeypatch.setattr(Authentication, "run_transaction", lambda callback: callback(None))
+    monkeypatch.setattr(Authentication, "convert_amounts", lambda amounts, to_currency: ({c: a * 80.0 for c, a in amounts.items()}, sum(amounts.values()) * 80.0))
+    return store
+
+
+def user_with_bank(monkeypatch, bank_name="SBI"):
+    object_id = ObjectId()
+    user = types.SimpleNamespace(id=object_id, homeBank=[{"bankName": bank_name}])
+    monkeypatch.setattr(Authentication, "find_user_profile", lambda oid: user if oid == object_id else None)
+    return str(object_id)
+
+
+def test_a_sweep_credits_the_bank_and_empties_the_balances(wallets, monkeypatch):
+    uid = user_with_bank(monkeypatch)
+    wallets.create(uid, {"USD": 2, "EUR": 1, "INR": 0})
+    credits = []
+    monkeypatch.setattr(Authentication, "credit_home_bank", lambda object_id, bank, amount, session=None: credits.append((bank, amount)) or True)
+
+    response, status = Authentication.returnMoney(FakeRequest({"uid": uid, "bankName": "sbi", "currencies": "all"}))
+    assert status == 200
+    assert response["data"]["skipped"] == ["INR"]
+    assert credits == [("SBI", 240.0)]
+    assert wallets.find(uid).balances == {"USD": 0, "EUR": 0, "INR": 0}
+
+
+def test_balances_are_restored_when_the_bank_credit_fails(wallets, monkeypatch):
+    uid = user_with_bank(monkeypatch)
+    wallets.create(uid, {"USD": 2, "EUR": 1})
+
+    def unavailable(object_id, bank, amount, session=None):
+        raise PyMongoError("connection reset")
+    monkeypatch.setattr(Authentication, "credit_home_bank", unavailable)
+
+    _, status = Authentication.returnMoney(FakeRequest({"uid": uid, "bankName": "SBI", "currencies": ["USD", "EUR"]}))
+    assert status == 500
+    assert wallets.find(uid).balances == {"USD": 2, "EUR": 1}
+
+
+def test_balances_are_restored_when_the_bank_disappears(wallets, monkeypatch):
+    uid = user_with_bank(monkeypatch)
+    wallets.create(uid, {"USD": 2})
+    monkeypatch.setattr(Authentication, "credit_home_bank", lambda object_id, bank, amount, session=None: False)
+
+    _, status = Authentication.returnMoney(FakeRequest({"uid": uid, "bankName": "SBI", "currency": "usd"}))
+    assert status == 404
+    assert wallets.find(uid).balances == {"USD": 2}
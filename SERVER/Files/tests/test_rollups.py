@@ -0,0 +1,105 @@
+import datetime #type: ignore
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+
+from contollers.db.Rollups import TransactionRollups
+
+
+def conversion(uid, from_currency, from_amount, to_currency, to_amount, when):
+    return {"uid": uid, "type": "homeDelivery", "status": "success", "createdat": when,
+            "fromCurrency": from_currency, "fromAmount": from_amount, "toCurrency": to_currency, "toAmount": to_amount}
+
+
+@pytest.fixture
+def rollups():
+    db = mongomock.MongoClient().db
+    return TransactionRollups(db.transactionRollups, db.transactions)
+
+
+def log(rollups, *transactions):
+    rollups.transactions.insert_many([dict(t) for t in transactions])
+    rollups.record(transactions)
+
+
+class GroupedTransactions:
+    # What TransactionRollups.pipeline() yields from MongoDB: one row per
+    # (month, currency, side). mongomock cannot evaluate the field paths inside
+    # the pipeline's array literal, so the rows are given directly.
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def aggregate(self, pipeline, **kwargs):
+        return iter(self.rows)
+
+
+def row(month, currency, side, amount, count, last):
+    return {"_id": {"month": month, "currency": currency, "side": side}, "amount": amount, "count": count, "lastActivity": last}
+
+
+def filled(totals):
+    # Incremental updates only create the counters they $inc; a rebuild writes zeros
+    return {currency: dict({"fromAmount": 0, "fromCount": 0, "toAmount": 0, "toCount": 0}, **values) for currency, values in totals.items()}
+
+
+def test_incremental_updates_match_a_rebuild(rollups):
+    march, april = datetime.datetime(2024, 3, 5), datetime.datetime(2024, 4, 1)
+    rollups.record([conversion("u1", "USD", 10, "INR", 800, march), conversion("u1", "USD", 5, "EUR", 4, april)])
+    incremental = rollups.collection.find_one({"_id": "u1"})
+    assert not incremental["complete"]
+
+    rollups.transactions = GroupedTransactions([
+        row("2024-03", "USD", "from", 10, 1, march),
+        row("2024-03", "INR", "to", 800, 1, march),
+        row("2024-04", "USD", "from", 5, 1, april),
+        row("2024-04", "EUR", "to", 4, 1, april),
+    ])
+    rebuilt = rollups.rebuild("u1")
+    assert rebuilt["complete"]
+    assert (rebuilt["count"], rebuilt["lastActivity"]) == (incremental["count"], incremental["lastActivity"])
+    assert rebuilt["currencies"] == filled(incremental["currencies"])
+    assert rebuilt["months"] == {month: filled(totals) for month, totals in incremental["months"].items()}
+    assert rollups.collection.find_one({"_id": "u1"})["complete"]
+
+
+def test_summary_rebuilds_an_incomplete_rollup_once(rollups):
+    rollups.transactions.insert_one(conversion("u1", "USD", 10, "INR", 800, datetime.datetime(2024, 3, 5)))
+    log(rollups, conversion("u1", "USD", 1, "INR", 80, datetime.datetime(2024, 3, 6)))
+
+    summary = rollups.summary("u1")
+    assert summary["complete"] and summary["count"] == 2
+    assert rollups.collection.find_one({"_id": "u1"})["count"] == 2
+
+
+def test_rebuild_retries_when_an_update_lands_while_aggregating(rollups):
+    # Only counts are checked: mongomock gets the per-currency rows wrong (see GroupedTransactions)
+    log(rollups, conversion("u1", "USD", 10, "INR", 800, datetime.datetime(2024, 3, 5)))
+    compute = rollups.compute
+    raced = []
+
+    def compute_with_a_concurrent_update(uid):
+        rollup = compute(uid)
+        if not raced:
+            raced.append(1)
+            log(rollups, conversion("u1", "USD", 1, "INR", 80, datetime.datetime(2024, 3, 6)))
+        return rollup
+
+    rollups.compute = compute_with_a_concurrent_update
+    rebuilt = rollups.rebuild("u1")
+    assert raced and rebuilt["count"] == 2
+    assert rollups.collection.find_one({"_id": "u1"})["count"] == 2
+
+
+def test_users_without_conversions_get_no_document(rollups):
+    summary = rollups.summary("nobody")
+    assert summary["count"] == 0 and summary["currencies"] == {}
+    assert rollups.collection.count_documents({}) == 0
+
+
+def test_conversion_summary_rejects_invalid_uids(monkeypatch):
+    pytest.importorskip("flask")
+    from contollers.auth import Authentication
+    monkeypatch.setattr(Authentication, "find_conversion_summary", lambda uid: pytest.fail("must not query"))
+    _, status = Authentication.conversionSummary("anything")
+    assert status == 400
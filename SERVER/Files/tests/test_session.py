@@ -0,0 +1,21 @@
+import pytest #type: ignore
+
+from conftest import FakeRequest
+from contollers.auth import Session
+
+
+@pytest.mark.parametrize("header", ["Bearer " + "WzFd.AAAA", "Bearer abc.éé", "Bearer ", "Basic abc"])
+def test_unreadable_session_tokens_are_ignored(header):
+    assert Session.current_session(FakeRequest(headers={"Authorization": header})) is None
+
+
+def test_a_valid_session_is_returned_for_its_user():
+    token = Session.issue_session("u1", "Ann")
+    request = FakeRequest(headers={"Authorization": f"Bearer {token}"})
+    assert Session.session_user(request, "u1")["name"] == "Ann"
+    assert Session.session_user(request, "u2") is None
+
+
+def test_tokens_of_another_type_are_not_sessions():
+    token = Session.sessionSigner.sign({"typ": "quote", "uid": "u1"}, 60)
+    assert Session.current_session(FakeRequest(headers={"Authorization": f"Bearer {token}"})) is None
@@ -0,0 +1,50 @@
+import base64, json, time #type: ignore
+import pytest #type: ignore
+from contollers.utils.Tokens import TokenSigner,TokenError
+
+
+def encode(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_sign_and_verify_round_trip():
+    signer = TokenSigner({"a": b"secret"}, "a")
+    body = signer.verify(signer.sign({"uid": "u1"}, 60))
+    assert body["uid"] == "u1" and body["kid"] == "a"
+
+
+def test_rotated_keys_still_verify():
+    old = TokenSigner({"a": b"one"}, "a")
+    rotated = TokenSigner({"a": b"one", "b": b"two"}, "b")
+    assert rotated.verify(old.sign({"uid": "u1"}, 60))["uid"] == "u1"
+
+
+def test_expired_and_tampered_tokens_are_rejected():
+    signer = TokenSigner({"a": b"secret"}, "a")
+    with pytest.raises(TokenError):
+        signer.verify(signer.sign({}, -1))
+    encoded, mac = signer.sign({"uid": "u1"}, 60).split(".")
+    with pytest.raises(TokenError):
+        signer.verify(encode({"uid": "u2", "kid": "a", "exp": time.time() + 60}) + "." + mac)
+
+
+@pytest.mark.parametrize("token", [
+    None,
+    "",
+    "no-dot",
+    encode([1]) + ".AAAA",
+    encode({"kid": ["a"]}) + ".AAAA",
+    encode({"kid": "a", "exp": 1e18}) + ".éé",
+    "%%%.AAAA",
+])
+def test_malformed_tokens_raise_token_error(token):
+    signer = TokenSigner({"a": b"secret"}, "a")
+    with pytest.raises(TokenError):
+        signer.verify(token)
+
+
+def test_non_numeric_expiry_is_rejected():
+    signer = TokenSigner({"a": b"secret"}, "a")
+    encoded = encode({"kid": "a", "exp": "never"})
+    with pytest.raises(TokenError):
+        signer.verify(f"{encoded}.{signer._mac('a', encoded)}")
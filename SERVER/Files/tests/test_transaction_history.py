@@ -0,0 +1,112 @@
+import datetime, json #type: ignore
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+pytest.importorskip("flask")
+
+from bson import ObjectId #type: ignore
+from pymongo.errors import PyMongoError #type: ignore
+from contollers.auth import Authentication
+from contollers.db import Repository
+
+
+@pytest.fixture
+def history(monkeypatch):
+    collection = mongomock.MongoClient().db.transactions
+    monkeypatch.setattr(Repository, "moneyWithdrawlTransactionsCollection", collection)
+    return collection
+
+
+def log(history, uid, count, when=None):
+    # Several transactions share a timestamp when `when` is given, so _id decides their order
+    start = datetime.datetime(2024, 3, 1)
+    docs = [{"_id": ObjectId(), "uid": uid, "fromCurrency": "USD", "fromAmount": i,
+             "createdat": when or start + datetime.timedelta(minutes=i)} for i in range(count)]
+    history.insert_many(docs)
+    return docs
+
+
+def pages(uid, limit):
+    seen, cursor = [], None
+    while True:
+        response, status = Authentication.transactionHistory(uid, limit, cursor)
+        assert status == 200
+        seen.append([doc["_id"] for doc in response["data"]])
+        cursor = response["nextCursor"]
+        if cursor is None:
+            return seen
+
+
+def test_cursor_round_trips_the_position():
+    transaction = {"_id": ObjectId(), "createdat": datetime.datetime(2024, 3, 1, 9, 30, 0, 123000)}
+    token = Authentication.encode_history_cursor(transaction)
+    assert "=" not in token
+    assert Authentication.decode_history_cursor(token) == (transaction["createdat"], transaction["_id"])
+
+
+def test_pages_walk_every_transaction_once_newest_first(history):
+    docs = log(history, "u1", 7)
+    log(history, "someone-else", 3)
+    assert pages("u1", 3) == [[d["_id"] for d in reversed(docs)][i:i + 3] for i in (0, 3, 6)]
+
+
+def test_an_exactly_full_last_page_has_no_next_cursor(history):
+    log(history, "u1", 4)
+    assert [len(page) for page in pages("u1", 2)] == [2, 2]
+
+
+def test_transactions_with_the_same_timestamp_are_split_by_id(history):
+    docs = log(history, "u1", 5, when=datetime.datetime(2024, 3, 1))
+    walked = [doc_id for page in pages("u1", 2) for doc_id in page]
+    assert walked == sorted((d["_id"] for d in docs), reverse=True)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", Authentication.encode_history_cursor({"_id": "x", "createdat": datetime.datetime(2024, 1, 1)})])
+def test_bad_cursors_are_a_400(history, cursor):
+    assert Authentication.transactionHistory("u1", 2, cursor)[1] == 400
+
+
+def test_no_history_is_a_404(history):
+    assert Authentication.transactionHistory("u1")[1] == 404
+
+
+class FailingCursor:
+    # Yields `good` documents, then fails like a dropped connection
+    def __init__(self, good):
+        self.docs = iter(good)
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.docs)
+        except StopIteration:
+            raise PyMongoError("connection closed")
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_writes_one_document_per_line(history):
+    log(history, "u1", 3)
+    lines = b"".join(Authentication.streamTransactionHistory("u1", "fromAmount")).splitlines()
+    assert [json.loads(line)["fromAmount"] for line in lines] == [2, 1, 0]
+
+
+def test_stream_failing_before_the_first_document_raises(monkeypatch):
+    cursor = FailingCursor([])
+    monkeypatch.setattr(Authentication, "find_transactions", lambda *args, **kwargs: cursor)
+    with pytest.raises(PyMongoError):
+        Authentication.streamTransactionHistory("u1")
+    assert cursor.closed
+
+
+def test_stream_failing_midway_ends_with_an_error_line(monkeypatch):
+    cursor = FailingCursor([{"_id": ObjectId(), "createdat": datetime.datetime(2024, 3, 1)}] * 2)
+    monkeypatch.setattr(Authentication, "find_transactions", lambda *args, **kwargs: cursor)
+    lines = [json.loads(line) for line in b"".join(Authentication.streamTransactionHistory("u1")).splitlines()]
+    assert len(lines) == 3
+    assert lines[-1] == {"error": "connection closed", "success": False}
+    assert cursor.closed
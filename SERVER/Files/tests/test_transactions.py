@@ -0,0 +1,75 @@
+import types #type: ignore
+import pytest #type: ignore
+
+from contollers.db import Database,Repository
+
+
+class FakeSession:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def with_transaction(self, callback):
+        return callback(self)
+
+
+class FakeClient:
+    # Answers ping and describes a topology made of the given server types
+    def __init__(self, *server_types):
+        self.admin = self
+        self.pings = 0
+        servers = {(f"host{i}", 27017): types.SimpleNamespace(server_type_name=t) for i, t in enumerate(server_types)}
+        self.topology_description = types.SimpleNamespace(server_descriptions=lambda: servers)
+
+    def command(self, name, **kwargs):
+        self.pings += 1
+        return {"ok": 1}
+
+    def start_session(self):
+        return FakeSession()
+
+
+@pytest.fixture
+def use_client(monkeypatch):
+    monkeypatch.setattr(Database, "_transactions", None)
+    def use(client):
+        monkeypatch.setattr(Database, "get_client", lambda: client)
+        monkeypatch.setattr(Repository, "get_client", lambda: client)
+        return client
+    return use
+
+
+@pytest.mark.parametrize("server_types, supported", [
+    (["Standalone"], False),
+    (["RSPrimary", "RSSecondary"], True),
+    (["Mongos"], True),
+    (["LoadBalancer"], True),
+])
+def test_transaction_support_follows_the_topology(use_client, server_types, supported):
+    client = use_client(FakeClient(*server_types))
+    assert Database.supports_transactions() is supported
+    assert Database.supports_transactions() is supported
+    assert client.pings == 1
+
+
+def test_a_new_client_is_asked_again(use_client):
+    use_client(FakeClient("RSPrimary"))
+    assert Database.supports_transactions()
+    use_client(FakeClient("Standalone"))
+    assert not Database.supports_transactions()
+
+
+@pytest.mark.parametrize("setting, server_type, transactional", [
+    ("auto", "Standalone", False),
+    ("auto", "RSPrimary", True),
+    ("false", "RSPrimary", False),
+    ("true", "Standalone", True),
+])
+def test_run_transaction_only_opens_a_session_when_supported(use_client, monkeypatch, setting, server_type, transactional):
+    client = use_client(FakeClient(server_type))
+    monkeypatch.setattr(Repository, "MONGO_TRANSACTIONS", setting)
+    session = Repository.run_transaction(lambda session: session)
+    assert isinstance(session, FakeSession) is transactional
+    assert client.pings == (1 if setting == "auto" else 0)
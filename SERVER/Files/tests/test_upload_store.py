@@ -0,0 +1,57 @@
+import hashlib, io, os #type: ignore
+import pytest #type: ignore
+from contollers.utils.UploadStore import UploadStore
+
+
+class Upload:
+    # The parts of werkzeug's FileStorage the store reads
+    def __init__(self, data, filename):
+        self.stream = io.BytesIO(data)
+        self.filename = filename
+
+
+def test_files_are_stored_under_their_sha256(tmp_path):
+    store = UploadStore(chunk_size=4)
+    data = b"passport scan bytes"
+    name = store.save(Upload(data, "My Passport.JPG"), str(tmp_path))
+    assert name == hashlib.sha256(data).hexdigest() + ".jpg"
+    assert (tmp_path / name).read_bytes() == data
+    assert store.stats()["bytes"] == len(data)
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = UploadStore()
+    first = store.save(Upload(b"same", "a.png"), str(tmp_path))
+    second = store.save(Upload(b"same", "b.png"), str(tmp_path))
+    assert first == second
+    assert os.listdir(tmp_path) == [first]
+    assert store.stats()["deduplicated"] == 1
+
+
+@pytest.mark.parametrize("filename", ["../../etc/passwd", "x.ph p", None, "noext", "a.toolongextension1"])
+def test_client_filenames_never_choose_the_path(tmp_path, filename):
+    name = UploadStore().save(Upload(b"data", filename), str(tmp_path))
+    assert name == hashlib.sha256(b"data").hexdigest()
+    assert os.listdir(tmp_path) == [name]
+
+
+def test_a_failed_upload_leaves_no_temporary_file(tmp_path):
+    class Broken(Upload):
+        def __init__(self):
+            super().__init__(b"", "a.jpg")
+            self.stream = self
+
+        def read(self, size):
+            raise IOError("client went away")
+
+    with pytest.raises(IOError):
+        UploadStore().save(Broken(), str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_save_many_keeps_the_order_of_its_parts(tmp_path):
+    store = UploadStore(workers=3)
+    parts = [(Upload(bytes([i]) * 100, f"{i}.jpg"), str(tmp_path / f"folder{i % 2}")) for i in range(5)]
+    names = store.save_many(parts)
+    assert names == [hashlib.sha256(bytes([i]) * 100).hexdigest() + ".jpg" for i in range(5)]
+    assert all(os.path.exists(tmp_path / f"folder{i % 2}" / name) for i, name in enumerate(names))
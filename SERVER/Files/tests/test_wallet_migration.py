@@ -0,0 +1,48 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+
+from contollers.db.WalletMigration import migrate_batch,migrate_wallets
+
+
+def legacy(uid, **balances):
+    return {"uid": uid, "balance": [{"currency": c, "amount": a} for c, a in balances.items()]}
+
+
+@pytest.fixture
+def wallets():
+    return mongomock.MongoClient().db.wallets
+
+
+def test_wallets_move_to_the_keyed_layout(wallets):
+    wallets.insert_many([legacy("a", USD=10, INR=5), legacy("b", EUR=1)])
+    wallets.insert_one({"uid": "c", "balances": {"USD": 1}})
+    assert migrate_wallets(wallets, batch_size=1, pause=0) == {"scanned": 2, "migrated": 2, "batches": 2, "remaining": 0}
+    assert wallets.find_one({"uid": "a"}, {"_id": 0}) == {"uid": "a", "balances": {"USD": 10, "INR": 5}}
+    assert wallets.find_one({"uid": "c"}, {"_id": 0}) == {"uid": "c", "balances": {"USD": 1}}
+
+
+def test_duplicate_entries_for_a_currency_are_summed(wallets):
+    wallets.insert_one({"uid": "a", "balance": [{"currency": "USD", "amount": 2}, {"currency": "USD", "amount": 3}]})
+    migrate_batch(wallets)
+    assert wallets.find_one({"uid": "a"})["balances"] == {"USD": 5}
+
+
+def test_a_transfer_between_read_and_write_is_not_overwritten(wallets, monkeypatch):
+    wallets.insert_many([legacy("a", USD=10), legacy("b", USD=10)])
+    bulk_write = wallets.bulk_write
+
+    def transfer_then_write(operations, **kwargs):
+        # A live debit on "a" lands after the batch read its balance list
+        wallets.update_one({"uid": "a"}, {"$set": {"balance.0.amount": 4}})
+        monkeypatch.setattr(wallets, "bulk_write", bulk_write)
+        return bulk_write(operations, **kwargs)
+
+    monkeypatch.setattr(wallets, "bulk_write", transfer_then_write)
+    assert migrate_batch(wallets) == (2, 1)
+    assert "balance" in wallets.find_one({"uid": "a"})
+    assert wallets.find_one({"uid": "b"})["balances"] == {"USD": 10}
+
+    # The next batch picks it up with the balance the transfer left
+    assert migrate_batch(wallets) == (1, 1)
+    assert wallets.find_one({"uid": "a"})["balances"] == {"USD": 4}
@@ -0,0 +1,65 @@
+import pytest #type: ignore
+
+mongomock = pytest.importorskip("mongomock")
+
+from conftest import ArrayFilterCollection
+from contollers.db.WalletStore import WalletStore
+
+
+@pytest.fixture
+def store():
+    return WalletStore(ArrayFilterCollection(mongomock.MongoClient().db.wallets))
+
+
+def keyed_wallet(store, balances):
+    store.create("u1", balances)
+    return store.find("u1")
+
+
+def legacy_wallet(store, balances):
+    store.collection.insert_one({"uid": "u1", "balance": [{"currency": c, "amount": a} for c, a in balances.items()]})
+    return store.find("u1")
+
+
+@pytest.mark.parametrize("make_wallet", [keyed_wallet, legacy_wallet])
+def test_transfer_moves_funds_while_the_balance_covers_it(store, make_wallet):
+    wallet = make_wallet(store, {"USD": 10, "INR": 0})
+    assert store.transfer(wallet, "USD", 4, "INR", 320)
+    assert store.find("u1").balances == {"USD": 6, "INR": 320}
+
+
+@pytest.mark.parametrize("make_wallet", [keyed_wallet, legacy_wallet])
+def test_transfer_is_refused_when_the_balance_is_short(store, make_wallet):
+    wallet = make_wallet(store, {"USD": 3, "INR": 0})
+    assert not store.transfer(wallet, "USD", 4, "INR", 320)
+    assert store.find("u1").balances == {"USD": 3, "INR": 0}
+
+
+def test_legacy_credit_adds_a_missing_currency(store):
+    wallet = legacy_wallet(store, {"USD": 10})
+    assert wallet.legacy
+    assert store.transfer(wallet, "USD", 5, "EUR", 4)
+    assert store.find("u1").balances == {"USD": 5, "EUR": 4}
+
+
+def test_legacy_read_retries_against_a_migrated_wallet(store):
+    wallet = legacy_wallet(store, {"USD": 10, "INR": 0})
+    store.collection.update_one({"uid": "u1"}, {"$set": {"balances": {"USD": 10, "INR": 0}}, "$unset": {"balance": ""}})
+    assert store.debit(wallet, "USD", 2)
+    assert store.find("u1").balances == {"USD": 8, "INR": 0}
+
+
+@pytest.mark.parametrize("make_wallet", [keyed_wallet, legacy_wallet])
+def test_take_many_only_applies_while_every_balance_is_unchanged(store, make_wallet):
+    wallet = make_wallet(store, {"USD": 10, "EUR": 5, "INR": 0})
+    assert not store.take_many(wallet, {"USD": 10, "EUR": 4})
+    assert store.take_many(wallet, {"USD": 10, "EUR": 5})
+    assert store.find("u1").balances == {"USD": 0, "EUR": 0, "INR": 0}
+
+
+def test_invalid_currency_codes_are_rejected(store):
+    wallet = keyed_wallet(store, {"USD": 10})
+    with pytest.raises(ValueError):
+        store.credit(wallet, "usd", 1)
+    with pytest.raises(ValueError):
+        store.credit(wallet, "US.D", 1)